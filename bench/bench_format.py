@@ -0,0 +1,86 @@
+"""
+Benchmark: payload size and serialization time of each tool output format.
+
+Renders synthetic search, advanced-search and detail results in every format
+(optionally with a field projection) and reports bytes per response and time
+per render. JSON rendering uses orjson when it is installed; --stdlib forces
+the json module for comparison.
+
+Usage:
+    python bench/bench_format.py --records 20 --repeat 2000
+    python bench/bench_format.py --fields pmid,title,pubdate
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import formatting
+from formatting import render, FORMATS
+from models import Article, ArticleSummary
+
+JOURNALS = ["N Engl J Med", "Lancet", "J Clin Oncol", "Gastroenterology", "Ann Oncol"]
+
+def summary(i: int) -> ArticleSummary:
+    return ArticleSummary(
+        pmid=str(30000000 + i),
+        title=f"Effect of treatment {i} on survival in patients with advanced gastric cancer: a randomized trial",
+        authors=tuple(f"Author{j} AB" for j in range(8)),
+        pubdate="2023 Mar",
+        source=JOURNALS[i % len(JOURNALS)],
+        pub_types=("Journal Article",),
+    )
+
+def article(i: int) -> Article:
+    return Article(
+        pmid=str(30000000 + i),
+        title=f"Effect of treatment {i} on survival in patients with advanced gastric cancer: a randomized trial",
+        authors=tuple(f"Author{j} Name" for j in range(8)),
+        journal=JOURNALS[i % len(JOURNALS)],
+        doi=f"10.1000/ex.{i}",
+        abstract=f"Background {i}. " + "Patients were randomized to receive treatment or placebo. " * 15,
+    )
+
+def payloads(count: int) -> dict:
+    return {
+        "search_pubmed": [
+            {"pmid": s.pmid, "title": s.title, "authors": ", ".join(s.authors[:3]), "pubdate": s.pubdate, "source": s.source}
+            for s in map(summary, range(count))
+        ],
+        "advanced_search_pubmed": [
+            {"pmid": s.pmid, "title": s.title, "pubdate": s.pubdate, "source": s.source, "authors": [{"name": n} for n in s.authors]}
+            for s in map(summary, range(count))
+        ],
+        "get_papers_details": [article(i).to_dict() for i in range(count)],
+    }
+
+def measure(obj, format: str, fields, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        text = render(obj, format, fields)
+    elapsed = time.perf_counter() - start
+    return len(text.encode("utf-8")), elapsed / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20, help="Records per response")
+    parser.add_argument("--repeat", type=int, default=1000, help="Renders per measurement")
+    parser.add_argument("--fields", help="Comma-separated field projection applied to every format")
+    parser.add_argument("--stdlib", action="store_true", help="Use the json module even if orjson is installed")
+    args = parser.parse_args()
+
+    if args.stdlib:
+        formatting.orjson = None
+    print(f"records={args.records} serializer={'orjson' if formatting.orjson else 'json'} fields={args.fields or 'all'}")
+    print(f"{'tool':<24}{'format':<10}{'bytes':>9}{'vs json':>9}{'us/render':>11}")
+    for tool, obj in payloads(args.records).items():
+        baseline = None
+        for format in FORMATS:
+            size, seconds = measure(obj, format, args.fields, args.repeat)
+            baseline = baseline or size
+            print(f"{tool:<24}{format:<10}{size:>9}{size / baseline:>8.0%}{seconds * 1e6:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: streaming efetch parser (pubmed_xml) vs the previous xmltodict path.
+
+Usage:
+    python bench/bench_parser.py                     # synthetic 500-record fixture
+    python bench/bench_parser.py --records 2000
+    python bench/bench_parser.py --fixture efetch.xml  # a recorded efetch response
+
+Record a real fixture with e.g.:
+    curl -o efetch.xml "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&retmode=xml&id=..."
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xmltodict
+from pubmed_xml import ArticleStreamParser
+
+CHUNK_SIZE = 64 * 1024
+
+def synthetic_article(pmid: int) -> str:
+    """A record roughly the size of a typical efetch PubmedArticle (authors, MeSH, references)"""
+    authors = "".join(
+        f"<Author ValidYN=\"Y\"><LastName>Author{i}</LastName><ForeName>Name {i}</ForeName><Initials>N</Initials>"
+        f"<AffiliationInfo><Affiliation>Department of Medicine {i}, Example University Hospital, Tokyo, Japan.</Affiliation></AffiliationInfo></Author>"
+        for i in range(12)
+    )
+    sections = "".join(
+        f"<AbstractText Label=\"{label}\" NlmCategory=\"{label}\">{label.title()} of study {pmid}. " + "Lorem ipsum dolor sit amet, <i>consectetur</i> adipiscing elit. " * 6 + "</AbstractText>"
+        for label in ("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS")
+    )
+    mesh = "".join(
+        f"<MeshHeading><DescriptorName UI=\"D{i:06d}\" MajorTopicYN=\"N\">Heading {i}</DescriptorName></MeshHeading>"
+        for i in range(15)
+    )
+    refs = "".join(
+        f"<Reference><Citation>Reference {i} et al. J Example. 2020;1:{i}.</Citation><ArticleIdList><ArticleId IdType=\"pubmed\">{pmid + i}</ArticleId></ArticleIdList></Reference>"
+        for i in range(40)
+    )
+    return (
+        f"<PubmedArticle><MedlineCitation Status=\"MEDLINE\" Owner=\"NLM\"><PMID Version=\"1\">{pmid}</PMID>"
+        f"<Article PubModel=\"Print\"><Journal><ISSN IssnType=\"Electronic\">1234-5678</ISSN>"
+        f"<JournalIssue CitedMedium=\"Internet\"><Volume>10</Volume><Issue>2</Issue><PubDate><Year>2023</Year><Month>Jan</Month></PubDate></JournalIssue>"
+        f"<Title>Journal of Examples</Title><ISOAbbreviation>J Examples</ISOAbbreviation></Journal>"
+        f"<ArticleTitle>Effect of treatment {pmid} on <i>outcomes</i> in a randomized trial.</ArticleTitle>"
+        f"<Abstract>{sections}</Abstract><AuthorList CompleteYN=\"Y\">{authors}</AuthorList>"
+        f"<PublicationTypeList><PublicationType UI=\"D016449\">Randomized Controlled Trial</PublicationType></PublicationTypeList></Article>"
+        f"<MeshHeadingList>{mesh}</MeshHeadingList></MedlineCitation>"
+        f"<PubmedData><ArticleIdList><ArticleId IdType=\"pubmed\">{pmid}</ArticleId><ArticleId IdType=\"doi\">10.1000/ex.{pmid}</ArticleId>"
+        f"<ArticleId IdType=\"pmc\">PMC{pmid}</ArticleId></ArticleIdList><ReferenceList>{refs}</ReferenceList></PubmedData></PubmedArticle>"
+    )
+
+def synthetic_fixture(count: int) -> bytes:
+    body = "".join(synthetic_article(30000000 + i) for i in range(count))
+    return (
+        "<?xml version=\"1.0\" ?>\n"
+        "<!DOCTYPE PubmedArticleSet PUBLIC \"-//NLM//DTD PubMedArticle, 1st January 2024//EN\" "
+        "\"https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd\">\n"
+        f"<PubmedArticleSet>{body}</PubmedArticleSet>"
+    ).encode("utf-8")
+
+def xmltodict_records(xml: bytes) -> list:
+    """The previous implementation: decode to text, build the full dict tree, then walk it"""
+    data = xmltodict.parse(xml.decode("utf-8"))
+    articles = (data.get("PubmedArticleSet") or {}).get("PubmedArticle") or []
+    if isinstance(articles, dict):
+        articles = [articles]
+    records = []
+    for pubmed_article in articles:
+        pmid = pubmed_article["MedlineCitation"]["PMID"]
+        pmid = pmid.get("#text", "") if isinstance(pmid, dict) else pmid
+        article = pubmed_article["MedlineCitation"]["Article"]
+        abstract_text = ""
+        if "Abstract" in article and "AbstractText" in article["Abstract"]:
+            abs_content = article["Abstract"]["AbstractText"]
+            if isinstance(abs_content, list):
+                abstract_text = "\n".join([item.get("#text", "") if isinstance(item, dict) else item for item in abs_content])
+            elif isinstance(abs_content, dict):
+                abstract_text = abs_content.get("#text", "")
+            else:
+                abstract_text = abs_content
+        authors = []
+        auth_list = article.get("AuthorList", {}).get("Author", [])
+        if isinstance(auth_list, dict):
+            auth_list = [auth_list]
+        for auth in auth_list:
+            if "LastName" in auth and "ForeName" in auth:
+                authors.append(f"{auth['LastName']} {auth['ForeName']}")
+        doi = None
+        pmc_id = None
+        id_list = pubmed_article.get("PubmedData", {}).get("ArticleIdList", {}).get("ArticleId", [])
+        if not isinstance(id_list, list):
+            id_list = [id_list]
+        for article_id in id_list:
+            if isinstance(article_id, dict):
+                if article_id.get("@IdType") == "doi":
+                    doi = article_id.get("#text")
+                elif article_id.get("@IdType") == "pmc":
+                    pmc_id = article_id.get("#text")
+        records.append({
+            "pmid": pmid,
+            "title": article.get("ArticleTitle", "No title"),
+            "authors": authors,
+            "journal": article.get("Journal", {}).get("Title", ""),
+            "doi": doi,
+            "pmc_id": pmc_id,
+            "abstract": abstract_text,
+        })
+    return records
+
+def streaming_records(xml: bytes) -> list:
+    """The streaming parser, fed in network-sized chunks"""
+    parser = ArticleStreamParser()
+    records = []
+    for i in range(0, len(xml), CHUNK_SIZE):
+        records.extend(parser.feed(xml[i:i + CHUNK_SIZE]))
+    records.extend(parser.close())
+    return records
+
+def measure(fn, xml: bytes, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = fn(xml)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(xml)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Path to a recorded efetch XML response")
+    parser.add_argument("--records", type=int, default=500, help="Number of synthetic records")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, "rb") as f:
+            xml = f.read()
+    else:
+        xml = synthetic_fixture(args.records)
+
+    print(f"Fixture: {len(xml) / 1024 / 1024:.1f} MiB")
+    print(f"{'parser':<12}{'records':>10}{'best ms':>12}{'records/s':>12}{'peak MiB':>12}")
+    for name, fn in (("xmltodict", xmltodict_records), ("streaming", streaming_records)):
+        records, seconds, peak = measure(fn, xml, args.repeat)
+        print(f"{name:<12}{len(records):>10}{seconds * 1000:>12.1f}{len(records) / seconds:>12.0f}{peak / 1024 / 1024:>12.1f}")
+
+if __name__ == "__main__":
+    main()
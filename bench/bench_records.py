@@ -0,0 +1,57 @@
+"""
+Benchmark: memory held by cached records as plain dicts vs slotted Article objects.
+
+Usage:
+    python bench/bench_records.py --records 10000
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Article
+
+JOURNALS = ["N Engl J Med", "Lancet", "J Clin Oncol", "Gastroenterology", "Ann Oncol"]
+
+def record_dict(i: int) -> dict:
+    pmid = str(30000000 + i)
+    return {
+        "pmid": pmid,
+        "title": f"Effect of treatment {i} on outcomes in a randomized trial",
+        "authors": [f"Author{j} Name {j}" for j in range(8)],
+        # Journal names arrive as fresh strings from each parsed response
+        "journal": "".join(JOURNALS[i % len(JOURNALS)]),
+        "doi": f"10.1000/ex.{i}",
+        "pmc_id": None,
+        "abstract": f"Abstract {i} " + "lorem ipsum " * 100,
+        "links": {
+            "pubmed": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            "doi": f"https://doi.org/10.1000/ex.{i}"
+        }
+    }
+
+def measure(build, count: int) -> int:
+    tracemalloc.start()
+    records = [build(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = {
+        "dict": measure(record_dict, args.records),
+        "Article": measure(lambda i: Article.from_dict(record_dict(i)), args.records),
+    }
+    print(f"{'type':<10}{'total MiB':>12}{'bytes/record':>15}")
+    for name, total in results.items():
+        print(f"{name:<10}{total / 1024 / 1024:>12.1f}{total / args.records:>15.0f}")
+
+if __name__ == "__main__":
+    main()
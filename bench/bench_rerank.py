@@ -0,0 +1,59 @@
+"""
+Benchmark: reranking time for growing candidate pools.
+
+Scores synthetic summaries with every rerank signal enabled and reports the
+time per rerank call. Batches of rerank.NUMPY_MIN_CANDIDATES or more use
+NumPy when it is installed; --pure forces the plain Python path for
+comparison.
+
+Usage:
+    python bench/bench_rerank.py --candidates 100,500,2000 --repeat 200
+    python bench/bench_rerank.py --pure
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rerank
+from models import ArticleSummary
+
+JOURNALS = ["N Engl J Med", "Lancet", "J Clin Oncol", "Cancers (Basel)", "PLoS One"]
+WEIGHTS = {"relevance": 1.0, "similarity": 1.0, "review": -0.5, "recency": 0.5, "journal": 0.5}
+
+def summary(i: int) -> ArticleSummary:
+    return ArticleSummary(
+        pmid=str(30000000 + i),
+        title=f"Effect of treatment {i} on survival in patients with advanced gastric cancer",
+        pubdate=f"{2000 + i % 25} Mar",
+        source=JOURNALS[i % len(JOURNALS)],
+        pub_types=("Review",) if i % 7 == 0 else ("Journal Article",),
+    )
+
+def measure(summaries: list, similarity: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rerank.rerank(summaries, WEIGHTS, similarity)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", default="20,100,500,2000", help="Comma-separated candidate pool sizes")
+    parser.add_argument("--repeat", type=int, default=100, help="Rerank calls per measurement")
+    parser.add_argument("--pure", action="store_true", help="Use plain Python even if NumPy is installed")
+    args = parser.parse_args()
+
+    if args.pure:
+        rerank._numpy = False
+    print(f"backend={'numpy' if rerank._load_numpy() is not None else 'python'} (from {rerank.NUMPY_MIN_CANDIDATES} candidates)")
+    print(f"{'candidates':>10}{'ms/rerank':>11}{'us/candidate':>14}")
+    for count in map(int, args.candidates.split(",")):
+        summaries = [summary(i) for i in range(count)]
+        similarity = [100000 - i * 37 for i in range(count)]
+        seconds = measure(summaries, similarity, args.repeat)
+        print(f"{count:>10}{seconds * 1e3:>11.3f}{seconds / count * 1e6:>14.2f}")
+
+if __name__ == "__main__":
+    main()
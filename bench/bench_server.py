@@ -0,0 +1,200 @@
+"""
+Latency/throughput benchmark for the MCP server against a local E-utilities stand-in.
+
+Starts bench/mock_eutils.py in-process, launches the server as a subprocess
+pointed at it, drives concurrent tools/call requests over stdio JSON-RPC and
+reports p50/p95/p99 latency, requests/s and upstream calls per tool.
+
+Usage:
+    python bench/bench_server.py
+    python bench/bench_server.py --requests 100 --concurrency 16 --latency-ms 120 --rate-429 0.02
+    python bench/bench_server.py --server server.py      # FastMCP version (needs `mcp`)
+    python bench/bench_server.py --fixtures bench/fixtures
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from mock_eutils import MockEutilsServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def workload(tool: str, i: int, distinct: int) -> dict:
+    """Arguments for the i-th call of a tool; `distinct` bounds how many different inputs are used"""
+    k = i % distinct
+    if tool == "search_pubmed":
+        return {"query": f"gastric cancer {k}", "max_results": 10}
+    if tool == "advanced_search_pubmed":
+        return {"query": f"immunotherapy {k}", "journal": "Lancet", "pub_date_from": "2020/01/01", "max_results": 10}
+    if tool == "get_paper_details":
+        return {"pmid": str(30000000 + k)}
+    if tool == "get_papers_details":
+        return {"pmids": [str(30000000 + k * 20 + j) for j in range(20)]}
+    if tool == "get_similar_articles":
+        return {"pmid": str(30000000 + k), "max_results": 10, "high_impact_only": k % 2 == 0}
+    if tool == "multi_search_pubmed":
+        return {"queries": [f"gastric cancer {k}", f"stomach neoplasms {k}", {"query": f"immunotherapy {k}", "journal": "Lancet"}], "max_results": 10}
+    if tool == "get_similar_articles_batch":
+        return {"pmids": [str(30000000 + k * 10 + j) for j in range(10)], "max_results": 5}
+    if tool == "citation_graph":
+        return {"pmids": [str(30000000 + k)], "depth": 2, "max_links": 10, "format": "compact"}
+    if tool == "search_pubmed_paged":
+        return {"query": f"systematic review {k}", "page_size": 50}
+    return None
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+class StdioClient:
+    """Minimal JSON-RPC client for a server subprocess speaking newline-delimited JSON"""
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.pending = {}
+        self.next_id = 0
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            future = self.pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server exited"))
+
+    async def notify(self, method: str, params: dict = None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        self.proc.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    async def request(self, method: str, params: dict = None) -> dict:
+        self.next_id += 1
+        msg_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[msg_id] = future
+        message = {"jsonrpc": "2.0", "id": msg_id, "method": method, "params": params or {}}
+        self.proc.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+        return await future
+
+async def run_phase(client: StdioClient, mock: MockEutilsServer, tool: str, args) -> dict:
+    mock.reset()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def call(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request("tools/call", {"name": tool, "arguments": workload(tool, i, args.distinct)})
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[call(i) for i in range(args.requests)])
+    elapsed = time.perf_counter() - start
+    upstream = mock.stats()
+    return {
+        "tool": tool,
+        "requests": args.requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": args.requests / elapsed,
+        "upstream": {k.split(".")[0]: v for k, v in sorted(upstream.items())},
+    }
+
+async def main_async(args):
+    mock = MockEutilsServer(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_429=args.rate_429, enforce_rate=args.enforce_rate, fixtures=args.fixtures, seed=1,
+        stall_rate=args.stall_rate, stall_ms=args.stall_ms,
+    ).start()
+    cache_dir = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env.update({
+        "PUBMED_EUTILS_BASE_URL": mock.base_url,
+        "PUBMED_RATE_LIMIT": str(args.rate),
+        "PUBMED_CACHE_PATH": os.path.join(cache_dir.name, "records.sqlite3") if args.cache else "",
+        "PUBMED_INDEX_PATH": os.path.join(cache_dir.name, "index.sqlite3") if args.cache else "",
+    })
+    env.pop("NCBI_API_KEY", None)
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, args.server),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        stderr=None if args.verbose else asyncio.subprocess.DEVNULL,
+        env=env, limit=64 * 1024 * 1024,
+    )
+    client = StdioClient(proc)
+    try:
+        await client.request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "bench", "version": "0"},
+        })
+        await client.notify("notifications/initialized")
+        listed = await client.request("tools/list")
+        available = [tool["name"] for tool in listed["result"]["tools"]]
+        tools = [tool for tool in (args.tools or available) if tool in available and workload(tool, 0, 1) is not None]
+
+        results = [await run_phase(client, mock, tool, args) for tool in tools]
+    finally:
+        proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            proc.kill()
+        mock.stop()
+        cache_dir.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"server={args.server} requests/tool={args.requests} concurrency={args.concurrency} "
+          f"latency={args.latency_ms}ms rate={args.rate}/s cache={'on' if args.cache else 'off'}")
+    print(f"{'tool':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'errors':>8}  upstream calls")
+    for r in results:
+        upstream = ", ".join(f"{k}={v}" for k, v in r["upstream"].items())
+        print(f"{r['tool']:<24}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['rps']:>8.1f}{r['errors']:>8}  {upstream}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="server_stdio.py", help="Server script relative to the repository root")
+    parser.add_argument("--tools", nargs="*", help="Tools to benchmark (default: every tool with a workload)")
+    parser.add_argument("--requests", type=int, default=30, help="Calls per tool")
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight at once")
+    parser.add_argument("--distinct", type=int, default=10, help="Distinct inputs per tool (lower means more cache hits)")
+    parser.add_argument("--rate", type=float, default=10, help="PUBMED_RATE_LIMIT for the server")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of mock responses delayed by --stall-ms (tail latency)")
+    parser.add_argument("--stall-ms", type=float, default=2000.0)
+    parser.add_argument("--enforce-rate", type=float, help="Mock answers 429 above this many requests per second")
+    parser.add_argument("--fixtures", help="Directory of recorded fixtures to replay")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="Disable the on-disk record cache")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
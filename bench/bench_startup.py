@@ -0,0 +1,99 @@
+"""
+Benchmark: cold start of the MCP server.
+
+Launches a fresh server process per run (as an MCP client does for every
+session) and reports the time from spawning it to the initialize response,
+the tools/list response and the response to a first search_pubmed call
+against a local E-utilities stand-in.
+
+Usage:
+    python bench/bench_startup.py --runs 20
+    python bench/bench_startup.py --root /path/to/other/checkout   # compare with another version
+    python -X importtime server_stdio.py < /dev/null 2> imports.txt  # what is imported, and how long it takes
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from mock_eutils import MockEutilsServer
+from bench_server import StdioClient, percentile, ROOT
+
+PHASES = ("initialize", "tools/list", "first call")
+
+async def cold_start(args, env: dict) -> dict:
+    """Spawn one server and time its first responses (seconds since spawn)"""
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(args.root, args.server),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        stderr=None if args.verbose else asyncio.subprocess.DEVNULL,
+        env=env, limit=64 * 1024 * 1024,
+    )
+    client = StdioClient(proc)
+    timings = {}
+    try:
+        await client.request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "bench", "version": "0"},
+        })
+        timings["initialize"] = time.perf_counter() - start
+        await client.notify("notifications/initialized")
+        await client.request("tools/list")
+        timings["tools/list"] = time.perf_counter() - start
+        await client.request("tools/call", {"name": "search_pubmed", "arguments": {"query": "gastric cancer", "max_results": 5}})
+        timings["first call"] = time.perf_counter() - start
+    finally:
+        proc.stdin.close()
+        await proc.wait()
+        client.reader.cancel()
+    return timings
+
+async def main_async(args):
+    mock = MockEutilsServer(latency_ms=args.latency_ms, seed=1).start()
+    cache_dir = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env.update({
+        "PUBMED_EUTILS_BASE_URL": mock.base_url,
+        "PUBMED_CACHE_PATH": os.path.join(cache_dir.name, "records.sqlite3"),
+        "PUBMED_INDEX_PATH": os.path.join(cache_dir.name, "index.sqlite3"),
+    })
+    env.pop("NCBI_API_KEY", None)
+    try:
+        runs = [await cold_start(args, env) for _ in range(args.runs)]
+    finally:
+        mock.stop()
+        cache_dir.cleanup()
+
+    results = {
+        phase: {
+            "p50_ms": percentile([run[phase] for run in runs], 50) * 1000,
+            "p95_ms": percentile([run[phase] for run in runs], 95) * 1000,
+            "min_ms": min(run[phase] for run in runs) * 1000,
+        }
+        for phase in PHASES
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.server} ({args.root}), {args.runs} cold starts, mock latency {args.latency_ms:.0f} ms")
+    print(f"{'response':<14}{'p50 ms':>9}{'p95 ms':>9}{'min ms':>9}")
+    for phase, stats in results.items():
+        print(f"{phase:<14}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['min_ms']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="server_stdio.py", help="Server script relative to --root")
+    parser.add_argument("--root", default=ROOT, help="Checkout to start the server from (default: this repository)")
+    parser.add_argument("--runs", type=int, default=10, help="Cold starts to measure")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mock E-utilities latency for the first call")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
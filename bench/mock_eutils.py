@@ -0,0 +1,274 @@
+"""
+Local stand-in for NCBI E-utilities (esearch, esummary, efetch, elink).
+
+Responses are replayed from recorded fixtures when available and otherwise
+synthesized deterministically, with configurable latency and error/429
+injection. Used by bench_server.py, but can also be run on its own:
+
+    python bench/mock_eutils.py --port 8765 --latency-ms 80 --rate-429 0.05
+    PUBMED_EUTILS_BASE_URL=http://127.0.0.1:8765 python server_stdio.py
+
+Record fixtures from the live service (one file per distinct request):
+
+    python bench/mock_eutils.py --fixtures bench/fixtures --record
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from bench_parser import synthetic_article
+
+LIVE_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+ENDPOINTS = ("esearch.fcgi", "esummary.fcgi", "efetch.fcgi", "elink.fcgi")
+# Parameters that don't change the response and are left out of fixture keys
+IGNORED_PARAMS = {"api_key", "tool", "email"}
+TOTAL_HITS = 5000
+
+def fixture_key(endpoint: str, params: dict) -> str:
+    canonical = urlencode(sorted((k, v) for k, v in params.items() if k not in IGNORED_PARAMS))
+    return f"{endpoint.split('.')[0]}_{hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]}"
+
+def _params(pairs: list) -> dict:
+    """Query/form pairs as a dict; repeated keys (elink's id=1&id=2) are comma-joined"""
+    params = {}
+    for key, value in pairs:
+        params[key] = f"{params[key]},{value}" if key in params else value
+    return params
+
+def _search_ids(term: str, retstart: int, retmax: int) -> list:
+    """Deterministic PMIDs for a query so repeated runs see the same results"""
+    seed = int(hashlib.sha1(term.encode("utf-8")).hexdigest()[:6], 16)
+    stop = min(retstart + retmax, TOTAL_HITS)
+    return [str(20000000 + (seed + i * 7919) % 9000000) for i in range(retstart, stop)]
+
+def _history_ids(params: dict) -> list:
+    term = params.get("WebEnv", "").removeprefix("MOCK_")
+    return _search_ids(term, int(params.get("retstart", 0)), int(params.get("retmax", 20)))
+
+def _ids(params: dict) -> list:
+    if "id" in params:
+        return [pmid for pmid in params["id"].split(",") if pmid]
+    return _history_ids(params)
+
+def synthesize(endpoint: str, params: dict):
+    """Return (status, content_type, body) for a synthetic response"""
+    if endpoint == "esearch.fcgi":
+        term = params.get("term", "")
+        result = {
+            "count": str(TOTAL_HITS),
+            "retmax": params.get("retmax", "20"),
+            "retstart": params.get("retstart", "0"),
+            "idlist": _search_ids(term, int(params.get("retstart", 0)), int(params.get("retmax", 20))),
+        }
+        if params.get("usehistory") == "y":
+            result.update(webenv=f"MOCK_{term}", querykey="1")
+        return 200, "application/json", json.dumps({"esearchresult": result})
+
+    if endpoint == "esummary.fcgi":
+        ids = _ids(params)
+        result = {"uids": ids}
+        for pmid in ids:
+            n = int(pmid)
+            result[pmid] = {
+                "uid": pmid,
+                "title": f"Synthetic article {pmid}" + (": a systematic review" if n % 5 == 0 else ""),
+                "pubdate": f"{2000 + n % 25} Jan",
+                "sortpubdate": f"{2000 + n % 25}/01/01 00:00",
+                "source": ("N Engl J Med", "Lancet", "J Clin Oncol", "Cancers (Basel)", "PLoS One")[n % 5],
+                "fulljournalname": "Synthetic Journal",
+                "nlmuniqueid": str(n % 5),
+                "authors": [{"name": f"Author{i} A", "authtype": "Author", "clusterid": ""} for i in range(6)],
+                "pubtype": ["Review"] if n % 5 == 0 else ["Journal Article"],
+            }
+        return 200, "application/json", json.dumps({"header": {"type": "esummary"}, "result": result})
+
+    if endpoint == "efetch.fcgi":
+        body = "".join(synthetic_article(int(pmid)) for pmid in _ids(params))
+        return 200, "text/xml", f"<?xml version=\"1.0\" ?>\n<PubmedArticleSet>{body}</PubmedArticleSet>"
+
+    if endpoint == "elink.fcgi":
+        linkname = params.get("linkname", "pubmed_pubmed")
+        linksets = []
+        for pmid in _ids(params):
+            links = _search_ids(f"{linkname}:{pmid}", 0, 100)
+            if params.get("cmd") == "neighbor_score":
+                links = [{"id": link, "score": str(100000 - i * 500)} for i, link in enumerate(links)]
+            linksets.append({"dbfrom": "pubmed", "ids": [pmid], "linksetdbs": [{"dbto": "pubmed", "linkname": linkname, "links": links}]})
+        return 200, "application/json", json.dumps({"header": {"type": "elink"}, "linksets": linksets})
+
+    return 404, "text/plain", "Unknown endpoint"
+
+class MockEutilsServer:
+    """Threaded HTTP server emulating E-utilities"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 rate_429=0.0, enforce_rate=None, fixtures=None, record=False, seed=None,
+                 stall_rate=0.0, stall_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.stall_rate = stall_rate
+        self.stall = stall_ms / 1000
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.enforce_rate = enforce_rate
+        self.fixtures = fixtures
+        self.record = record
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self._recent = deque()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def _over_rate(self) -> bool:
+        """Emulate NCBI's own throttling: 429 when more than enforce_rate requests arrive within 1s"""
+        if not self.enforce_rate:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        self._recent.append(now)
+        return len(self._recent) > self.enforce_rate
+
+    def respond(self, endpoint: str, params: dict):
+        with self.lock:
+            self.counts[endpoint] += 1
+            throttled = self._over_rate()
+            roll = self.random.random()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            # Tail latency: an occasional response takes stall_ms longer
+            if self.random.random() < self.stall_rate:
+                delay += self.stall
+                self.counts["stalled"] += 1
+        time.sleep(delay)
+        if throttled or roll < self.rate_429:
+            with self.lock:
+                self.counts["429"] += 1
+            return 429, "application/json", json.dumps({"error": "API rate limit exceeded"}), {"Retry-After": "1"}
+        if roll < self.rate_429 + self.error_rate:
+            with self.lock:
+                self.counts["5xx"] += 1
+            return 502, "text/plain", "Bad Gateway", {}
+        if endpoint not in ENDPOINTS:
+            return 404, "text/plain", "Unknown endpoint", {}
+
+        if self.fixtures:
+            path = os.path.join(self.fixtures, fixture_key(endpoint, params))
+            if self.record:
+                status, content_type, body = self._fetch_live(endpoint, params)
+                if status == 200:
+                    os.makedirs(self.fixtures, exist_ok=True)
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump({"content_type": content_type, "body": body}, f)
+                return status, content_type, body, {}
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    fixture = json.load(f)
+                with self.lock:
+                    self.counts["replayed"] += 1
+                return 200, fixture["content_type"], fixture["body"], {}
+        return (*synthesize(endpoint, params), {})
+
+    def _fetch_live(self, endpoint: str, params: dict):
+        data = urlencode(params).encode("utf-8")
+        request = urllib.request.Request(f"{LIVE_BASE_URL}/{endpoint}", data=data)
+        with urllib.request.urlopen(request, timeout=60) as resp:
+            return resp.status, resp.headers.get("Content-Type", "text/plain"), resp.read().decode("utf-8")
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, params: dict):
+                endpoint = urlsplit(self.path).path.rsplit("/", 1)[-1]
+                status, content_type, body, headers = server.respond(endpoint, params)
+                payload = body.encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(payload)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (deadline or a hedged request that lost)
+                    self.close_connection = True
+
+            def do_GET(self):
+                self._handle(_params(parse_qsl(urlsplit(self.path).query)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                pairs = parse_qsl(urlsplit(self.path).query) + parse_qsl(self.rfile.read(length).decode("utf-8"))
+                self._handle(_params(pairs))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 502")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of requests delayed by --stall-ms")
+    parser.add_argument("--stall-ms", type=float, default=2000.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--enforce-rate", type=float, help="Answer 429 above this many requests per second")
+    parser.add_argument("--fixtures", help="Directory of recorded fixtures to replay")
+    parser.add_argument("--record", action="store_true", help="Forward requests to NCBI and save them as fixtures")
+    args = parser.parse_args()
+
+    server = MockEutilsServer(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_429=args.rate_429, enforce_rate=args.enforce_rate,
+        fixtures=args.fixtures, record=args.record, stall_rate=args.stall_rate, stall_ms=args.stall_ms,
+    )
+    print(f"Mock E-utilities listening on {server.base_url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Persistent record cache; set PUBMED_CACHE_PATH to an empty string to disable it
+CACHE_PATH = os.environ.get(
+    "PUBMED_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "mcp-pubmed-server", "records.sqlite3"),
+)
+CACHE_TTL = float(os.environ.get("PUBMED_CACHE_TTL_DAYS", "30")) * 86400
+CACHE_MAX_ENTRIES = int(os.environ.get("PUBMED_CACHE_MAX_ENTRIES", "50000"))
+
+# In-memory esearch result cache
+SEARCH_CACHE_SIZE = int(os.environ.get("PUBMED_SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.environ.get("PUBMED_SEARCH_CACHE_TTL", "600"))
+
+# Speculative prefetch of details for the top search hits; 0 disables it
+PREFETCH_TOP_K = int(os.environ.get("PUBMED_PREFETCH_TOP_K", "0"))
+PREFETCH_MAX_ENTRIES = int(os.environ.get("PUBMED_PREFETCH_MAX_ENTRIES", "500"))
+
+BOOLEAN_OPERATORS = {"AND", "OR", "NOT"}
+# PMIDs per "IN (...)" lookup, below SQLite's bound-variable limit (999 in older builds)
+SQL_BATCH_SIZE = 500
+
+class RecordCache:
+    """
+    SQLite-backed cache of PubMed records keyed by (kind, PMID): parsed efetch
+    details ("article"), compact esummary dicts ("article_summary") and elink
+    lists ("neighbors", "cited_by", "references").
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+        self._conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " kind TEXT NOT NULL, pmid TEXT NOT NULL, data TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, pmid))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed_at)")
+            logger.info(f"Opened record cache at {self.path}")
+        return self._conn
+
+    def get_many(self, kind: str, pmids: list) -> dict:
+        """Return {pmid: record} for the PMIDs that are cached and fresh"""
+        if not self.enabled or not pmids:
+            return {}
+        conn = self._connect()
+        now = time.time()
+        pmids = list(pmids)
+        found = {}
+        expired = []
+        for start in range(0, len(pmids), SQL_BATCH_SIZE):
+            batch = pmids[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT pmid, data, fetched_at FROM records WHERE kind = ? AND pmid IN ({placeholders})",
+                [kind, *batch],
+            )
+            for pmid, data, fetched_at in rows:
+                if now - fetched_at > self.ttl:
+                    expired.append(pmid)
+                else:
+                    found[pmid] = json.loads(data)
+        if found:
+            conn.executemany(
+                "UPDATE records SET accessed_at = ? WHERE kind = ? AND pmid = ?",
+                [(now, kind, pmid) for pmid in found],
+            )
+        if expired:
+            conn.executemany("DELETE FROM records WHERE kind = ? AND pmid = ?", [(kind, pmid) for pmid in expired])
+            self.stats["expired"] += len(expired)
+        conn.commit()
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(set(pmids)) - len(found)
+        return found
+
+    def put_many(self, kind: str, records: dict):
+        """Store {pmid: record} and evict least recently used entries over the limit"""
+        if not self.enabled or not records:
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO records (kind, pmid, data, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            [(kind, pmid, json.dumps(record, ensure_ascii=False), now, now) for pmid, record in records.items()],
+        )
+        self.stats["stores"] += len(records)
+        count = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if count > self.max_entries:
+            evicted = conn.execute(
+                "DELETE FROM records WHERE rowid IN (SELECT rowid FROM records ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            ).rowcount
+            self.stats["evictions"] += evicted
+        conn.commit()
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        if self.enabled and self._conn is not None:
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            logger.info(f"Record cache stats: {self.get_stats()}")
+            self._conn.close()
+            self._conn = None
+
+record_cache = RecordCache(CACHE_PATH, CACHE_TTL, CACHE_MAX_ENTRIES)
+
+def normalize_term(term: str) -> str:
+    """Normalize a PubMed query for cache lookups (whitespace and case, keeping AND/OR/NOT)"""
+    return " ".join(
+        token if token in BOOLEAN_OPERATORS else token.lower()
+        for token in (term or "").split()
+    )
+
+class SearchCache:
+    """
+    Bounded LRU + TTL cache of esearch PMID lists keyed by (normalized term, sort).
+    A cached result for a larger retmax also answers smaller requests, and
+    concurrent identical searches share a single upstream request.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._entries = OrderedDict()  # key -> (retmax, id_list, stored_at)
+        self._in_flight = {}  # key -> (retmax, task)
+
+    def _lookup(self, key, retmax: int):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        cached_retmax, id_list, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        # A short list means the query had fewer hits than was asked for, so it is complete
+        if cached_retmax < retmax and len(id_list) >= cached_retmax:
+            return None
+        self._entries.move_to_end(key)
+        return id_list[:retmax]
+
+    def _store(self, key, retmax: int, id_list: list):
+        current = self._entries.get(key)
+        if current is not None and current[0] > retmax and time.monotonic() - current[2] <= self.ttl:
+            return
+        self._entries[key] = (retmax, id_list, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _finish(self, key, retmax: int, task: asyncio.Task):
+        if self._in_flight.get(key, (None, None))[1] is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, retmax, task.result())
+
+    async def get_or_fetch(self, term: str, sort: str, retmax: int, fetch, timeout: float = None) -> list:
+        """
+        Return up to `retmax` PMIDs for the query, calling `fetch()` only on a
+        miss. The fetch is shared by every caller of the same query, so each
+        one waits at most its own `timeout` (asyncio.TimeoutError) without
+        cancelling it for the others.
+        """
+        key = (normalize_term(term), sort)
+        id_list = self._lookup(key, retmax)
+        if id_list is not None:
+            self.stats["hits"] += 1
+            return id_list
+
+        pending = self._in_flight.get(key)
+        if pending is not None and pending[0] >= retmax:
+            self.stats["coalesced"] += 1
+            id_list = await asyncio.wait_for(asyncio.shield(pending[1]), timeout)
+            return id_list[:retmax]
+
+        self.stats["misses"] += 1
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[key] = (retmax, task)
+        task.add_done_callback(lambda t: self._finish(key, retmax, t))
+        # Shielded so a cancelled (or timed out) caller doesn't abort the request others are waiting on
+        id_list = await asyncio.wait_for(asyncio.shield(task), timeout)
+        return id_list[:retmax]
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._entries)
+        return stats
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+class PrefetchStore:
+    """
+    Bounded in-memory LRU of records fetched speculatively, before anyone asked
+    for them (e.g. details of the top search hits). Lookups wait for prefetches
+    still in flight instead of fetching the same PMIDs again, and background
+    fetches are tracked per owner (client session) so they can be cancelled
+    when it goes away.
+    """
+
+    def __init__(self, top_k: int, max_entries: int):
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self.stats = {"scheduled": 0, "stored": 0, "hits": 0, "misses": 0, "used": 0, "unused_evictions": 0, "cancelled": 0, "errors": 0}
+        self._entries = OrderedDict()  # pmid -> [record, used]
+        self._pending = {}  # pmid -> task
+        self._tasks = {}  # owner -> set of tasks
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_k > 0 and self.max_entries > 0
+
+    def schedule(self, pmids: list, fetch, owner=None):
+        """Start `fetch(pmids)` (returning {pmid: record}) in the background for the first top_k PMIDs not yet held"""
+        if not self.enabled:
+            return None
+        pmids = [pmid for pmid in pmids[:self.top_k] if pmid not in self._entries and pmid not in self._pending]
+        if not pmids:
+            return None
+        task = asyncio.ensure_future(fetch(pmids))
+        for pmid in pmids:
+            self._pending[pmid] = task
+        self._tasks.setdefault(owner, set()).add(task)
+        task.add_done_callback(lambda t: self._finish(pmids, owner, t))
+        self.stats["scheduled"] += len(pmids)
+        return task
+
+    def _finish(self, pmids: list, owner, task: asyncio.Task):
+        for pmid in pmids:
+            if self._pending.get(pmid) is task:
+                del self._pending[pmid]
+        tasks = self._tasks.get(owner)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[owner]
+        if task.cancelled():
+            self.stats["cancelled"] += len(pmids)
+        elif task.exception() is not None:
+            self.stats["errors"] += len(pmids)
+            logger.warning(f"Prefetch of {len(pmids)} records failed: {task.exception()}")
+        else:
+            self.put_many(task.result())
+
+    def put_many(self, records: dict):
+        for pmid, record in records.items():
+            self._entries[pmid] = [record, False]
+            self._entries.move_to_end(pmid)
+        self.stats["stored"] += len(records)
+        while len(self._entries) > self.max_entries:
+            _, (_, used) = self._entries.popitem(last=False)
+            if not used:
+                self.stats["unused_evictions"] += 1
+
+    async def get_many(self, pmids: list, timeout: float = None) -> dict:
+        """
+        Return {pmid: record} for the PMIDs held, after waiting up to `timeout`
+        seconds for prefetches of them still in flight (the caller fetches the
+        rest itself)
+        """
+        if not self.enabled:
+            return {}
+        pending = {self._pending[pmid] for pmid in pmids if pmid in self._pending}
+        if pending:
+            # asyncio.wait neither raises the prefetch's error nor cancels it if this caller is cancelled
+            await asyncio.wait(pending, timeout=timeout)
+        found = {}
+        for pmid in pmids:
+            entry = self._entries.get(pmid)
+            if entry is None:
+                continue
+            self._entries.move_to_end(pmid)
+            if not entry[1]:
+                entry[1] = True
+                self.stats["used"] += 1
+            found[pmid] = entry[0]
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(set(pmids)) - len(found)
+        return found
+
+    def cancel(self, owner):
+        """Cancel the prefetches started on behalf of `owner`"""
+        for task in list(self._tasks.get(owner, ())):
+            task.cancel()
+
+    def cancel_all(self):
+        for owner in list(self._tasks):
+            self.cancel(owner)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        # Share of prefetched records that a later lookup actually used
+        stats["utilization"] = round(stats["used"] / stats["stored"], 3) if stats["stored"] else 0.0
+        stats["entries"] = len(self._entries)
+        stats["in_flight"] = len(self._pending)
+        return stats
+
+prefetch_store = PrefetchStore(PREFETCH_TOP_K, PREFETCH_MAX_ENTRIES)
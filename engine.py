@@ -0,0 +1,1160 @@
+import json
+import asyncio
+import logging
+import os
+import time
+import contextvars
+from eutils import open_client, close_client, set_flow, set_deadline, deadline_exceeded, DeadlineExceeded, PRIORITY_BULK
+from cache import record_cache, search_cache, prefetch_store
+from local_index import local_index
+from metrics import metrics, timed, current_tool, BYTES_BUCKETS
+from formatting import render, FORMATS
+from rerank import rerank, parse_weights, SIGNALS
+from journals import get_journal_index, is_high_impact_tier
+from pubmed_core import (
+    esearch, esearch_history, fetch_summaries, cached_summaries, fetch_summaries_page, fetch_articles, prefetch_articles, iter_summary_batches,
+    fetch_neighbors, expand_neighbors, build_citation_graph, encode_cursor, decode_cursor, reciprocal_rank_fusion, MAX_PAGE_SIZE
+)
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Maximum number of JSON-RPC requests processed concurrently
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("PUBMED_MAX_CONCURRENT_REQUESTS", "8"))
+# Maximum number of queries accepted by one multi_search_pubmed call
+MAX_MULTI_QUERIES = 10
+# Maximum number of PMIDs accepted by one get_papers_details call
+MAX_DETAIL_PMIDS = 1000
+# Deepest neighborhood get_similar_articles will expand
+MAX_SIMILAR_DEPTH = 3
+# Default rerank weights per tool (see rerank.py); these reproduce the plain ordering
+SEARCH_RANK_WEIGHTS = {"relevance": 1.0, "review": -2.0}  # reviews after original articles
+ADVANCED_RANK_WEIGHTS = {"relevance": 1.0}
+SIMILAR_RANK_WEIGHTS = {"similarity": 1.0}
+# Most candidates a call may over-fetch for reranking
+MAX_RERANK_POOL = 2000
+# Limits for citation_graph
+MAX_GRAPH_DEPTH = 3
+MAX_GRAPH_NODES = 2000
+CITATION_DIRECTIONS = {"both": ("cited_by", "references"), "cited_by": ("cited_by",), "references": ("references",)}
+
+# Latency budget for tool calls that don't pass budget_ms; 0 means no limit
+DEFAULT_BUDGET_MS = int(os.environ.get("PUBMED_TOOL_BUDGET_MS", "0"))
+
+# Client session the current request belongs to (set by transports serving several clients)
+current_session = contextvars.ContextVar("current_session", default=None)
+
+# --- Tool Implementations ---
+
+def dump_result(obj, format: str = "json", fields: list = None) -> str:
+    """Render a tool result in the requested format, recording the time spent"""
+    if format not in FORMATS:
+        # Rejected before timing so arbitrary client strings don't become metric labels
+        return render(obj, format, fields)
+    with timed("serialize_seconds", tool=current_tool.get(), format=format):
+        return render(obj, format, fields)
+
+def _search_result(summary) -> dict:
+    """Result entry for search_pubmed"""
+    author_names = summary.authors[:3]  # First 3 authors
+    return {
+        "pmid": summary.pmid,
+        "title": summary.title,
+        "authors": ", ".join(author_names) if author_names else "No authors",
+        "pubdate": summary.pubdate,
+        "source": summary.source
+    }
+
+def _advanced_result(summary) -> dict:
+    """Result entry for advanced_search_pubmed"""
+    return {
+        "pmid": summary.pmid,
+        "title": summary.title,
+        "pubdate": summary.pubdate,
+        "source": summary.source,
+        "authors": [{"name": name} for name in summary.authors]
+    }
+
+async def collect_summaries(
+    id_list: list,
+    format_result=None,
+    stream: bool = False,
+    progress=None,
+    format: str = "json",
+    fields: list = None
+) -> tuple:
+    """
+    Fetch summaries for id_list and return (summaries, partial). In streaming
+    mode each batch is reported through `progress(done, total, message)` as
+    soon as it arrives, rendered like the final result (format and fields).
+    If the call's latency budget runs out, the summaries obtained so far (or
+    cached) are returned with partial=True.
+    """
+    summaries = {}
+    try:
+        if not (stream and progress):
+            return await fetch_summaries(id_list), False
+        done = 0
+        async for batch_pmids, batch in iter_summary_batches(id_list):
+            summaries.update(batch)
+            done += len(batch_pmids)
+            partial = [format_result(batch[pmid]) for pmid in batch_pmids if pmid in batch]
+            await progress(done, len(id_list), dump_result(partial, format, fields))
+        return summaries, False
+    except DeadlineExceeded:
+        logger.warning(f"Time budget ran out with {len(summaries)} of {len(id_list)} summaries")
+        summaries.update(cached_summaries([pmid for pmid in id_list if pmid not in summaries]))
+        return summaries, True
+
+def with_partial(results, partial: bool):
+    """Mark results cut short by the latency budget: {"partial": true, "results": [...]}"""
+    if not partial:
+        return results
+    metrics.inc("tool_partial_results_total", tool=current_tool.get())
+    if isinstance(results, dict):
+        return {"partial": True, **results}
+    return {"partial": True, "results": results}
+
+def _rank(summaries: list, weights: dict, similarity: list = None) -> list:
+    """(summary, combined score) pairs, best first"""
+    with timed("rerank_seconds", tool=current_tool.get()):
+        order, scores = rerank(summaries, weights, similarity)
+    return [(summaries[i], scores[i]) for i in order]
+
+def _pool_size(max_results: int, rerank_pool: int = None) -> int:
+    """Candidates to retrieve: max_results, or more when over-fetching for reranking"""
+    return max(max_results, min(int(rerank_pool or 0), MAX_RERANK_POOL))
+
+async def search_pubmed(
+    query: str,
+    max_results: int = 5,
+    stream: bool = False,
+    progress=None,
+    format: str = "json",
+    fields: list = None,
+    rank_weights: dict = None,
+    rerank_pool: int = None
+) -> str:
+    """
+    Search PubMed for papers matching the query. Results are ordered by the
+    combined rerank score (by default relevance order with reviews last);
+    with rerank_pool more candidates are retrieved and only the best returned.
+    """
+    logger.info(f"Searching PubMed for: {query}")
+    try:
+        weights = parse_weights(rank_weights, SEARCH_RANK_WEIGHTS)
+    except ValueError as e:
+        return f"Error: {e}"
+    id_list = await esearch(query, _pool_size(max_results, rerank_pool))
+    
+    if not id_list:
+        return "No results found."
+
+    summaries, partial = await collect_summaries(id_list, _search_result, stream, progress, format, fields)
+    
+    ranked = _rank([summaries[pmid] for pmid in id_list if pmid in summaries], weights)[:max_results]
+    results = []
+    for summary, score in ranked:
+        result = _search_result(summary)
+        if rank_weights:
+            result["rank_score"] = round(score, 4)
+        results.append(result)
+    # PMIDs whose summaries didn't arrive in time
+    results.extend([{"pmid": pmid} for pmid in id_list if pmid not in summaries][:max_results - len(results)])
+    prefetch_articles([summary.pmid for summary, _ in ranked], current_session.get())
+    
+    return dump_result(with_partial(results, partial), format, fields)
+
+async def search_pubmed_paged(
+    query: str = None,
+    cursor: str = None,
+    page_size: int = 20,
+    sort: str = "relevance",
+    format: str = "json",
+    fields: list = None
+) -> str:
+    """
+    Page through a large search result set with the NCBI History server.
+    The first call takes a query; later calls pass back the returned next_cursor.
+    """
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+        except ValueError:
+            return "Error: Invalid cursor. Start again with a query."
+    elif query:
+        state = {"query": query, "sort": sort, "retstart": 0, "page_size": page_size}
+    else:
+        return "Error: Either query or cursor is required."
+    state["page_size"] = max(1, min(int(state["page_size"]), MAX_PAGE_SIZE))
+    logger.info(f"Paged search for: {state['query']} (retstart={state['retstart']})")
+
+    summaries = None
+    if state.get("webenv"):
+        summaries = await fetch_summaries_page(state["webenv"], state["query_key"], state["retstart"], state["page_size"])
+    if summaries is None:
+        # First page, or the WebEnv expired: (re)run the search on the History server
+        history = await esearch_history(state["query"], state["sort"])
+        state.update(history)
+        if state["count"] == 0 or not state["webenv"]:
+            return f"No results found for query: {state['query']}"
+        summaries = await fetch_summaries_page(state["webenv"], state["query_key"], state["retstart"], state["page_size"])
+        if summaries is None:
+            return f"Error retrieving results for query: {state['query']}"
+
+    results = [_search_result(summary) for summary in summaries]
+
+    next_start = state["retstart"] + state["page_size"]
+    next_cursor = None
+    if next_start < state["count"]:
+        next_cursor = encode_cursor({**state, "retstart": next_start})
+    page = {
+        "query": state["query"],
+        "total": state["count"],
+        "retstart": state["retstart"],
+        "results": results,
+        "next_cursor": next_cursor
+    }
+    return dump_result(page, format, fields)
+
+async def get_paper_details(pmid: str, format: str = "json", fields: list = None) -> str:
+    """Get detailed information (Abstract, Authors, DOI, Links) for a specific PMID"""
+    logger.info(f"Fetching details for PMID: {pmid}")
+    try:
+        articles = await fetch_articles([pmid])
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error parsing details for PMID {pmid}: {e}")
+        return f"Error retrieving details for PMID {pmid}: {str(e)}"
+    if pmid not in articles:
+        return f"Error: PMID {pmid} not found. Please check the PMID and try again."
+    return dump_result(articles[pmid].to_dict(), format, fields)
+
+async def get_papers_details(pmids: list, format: str = "json", fields: list = None) -> str:
+    """Get detailed information for many PMIDs at once (batched efetch)"""
+    pmids = [str(pmid).strip() for pmid in pmids or [] if str(pmid).strip()]
+    logger.info(f"Fetching details for {len(pmids)} PMIDs")
+    if not pmids:
+        return "Error: No PMIDs given."
+    if len(pmids) > MAX_DETAIL_PMIDS:
+        return f"Error: At most {MAX_DETAIL_PMIDS} PMIDs are allowed per call."
+    try:
+        articles = await fetch_articles(pmids, priority=PRIORITY_BULK, allow_partial=True)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching details for {len(pmids)} PMIDs: {e}")
+        return f"Error retrieving details for {len(pmids)} PMIDs: {str(e)}"
+    partial = len(articles) < len(set(pmids)) and deadline_exceeded()
+    results = []
+    for pmid in pmids:
+        if pmid in articles:
+            results.append(articles[pmid].to_dict())
+        elif partial:
+            results.append({"pmid": pmid, "error": "Not retrieved within the time budget."})
+        else:
+            results.append({"pmid": pmid, "error": f"PMID {pmid} not found. Please check the PMID and try again."})
+    return dump_result(with_partial(results, partial), format, fields)
+
+async def advanced_search_pubmed(
+    query: str,
+    author: str = None,
+    journal: str = None,
+    pub_date_from: str = None,
+    pub_date_to: str = None,
+    max_results: int = 5,
+    stream: bool = False,
+    progress=None,
+    format: str = "json",
+    fields: list = None,
+    rank_weights: dict = None,
+    rerank_pool: int = None
+) -> str:
+    """
+    Advanced search with filters for author, journal, and publication date.
+    Supports both structured parameters and natural language queries.
+    """
+    logger.info(f"Advanced search - Query: {query}, Author: {author}, Journal: {journal}")
+    try:
+        weights = parse_weights(rank_weights, ADVANCED_RANK_WEIGHTS)
+    except ValueError as e:
+        return f"Error: {e}"
+    
+    final_query = build_advanced_query(query, author, journal, pub_date_from, pub_date_to)
+    logger.info(f"Constructed query: {final_query}")
+    
+    # Use the same search logic as search_pubmed
+    id_list = await esearch(final_query, _pool_size(max_results, rerank_pool))
+    
+    if not id_list:
+        return f"No results found for query: {final_query}"
+
+    summaries, partial = await collect_summaries(id_list, _advanced_result, stream, progress, format, fields)
+    
+    ranked = _rank([summaries[pmid] for pmid in id_list if pmid in summaries], weights)[:max_results]
+    results = []
+    for summary, score in ranked:
+        result = _advanced_result(summary)
+        if rank_weights:
+            result["rank_score"] = round(score, 4)
+        results.append(result)
+    results.extend([{"pmid": pmid} for pmid in id_list if pmid not in summaries][:max_results - len(results)])
+    prefetch_articles([summary.pmid for summary, _ in ranked], current_session.get())
+    
+    return dump_result(with_partial(results, partial), format, fields)
+
+def build_advanced_query(
+    query: str,
+    author: str = None,
+    journal: str = None,
+    pub_date_from: str = None,
+    pub_date_to: str = None
+) -> str:
+    """PubMed search term for a query plus optional author, journal and date filters"""
+    query_parts = [f"({query})"]
+    
+    if author:
+        # Handle various author name formats
+        query_parts.append(f"({author}[Author])")
+    
+    if journal:
+        # Support both full names and abbreviations
+        query_parts.append(f"({journal}[Journal])")
+    
+    if pub_date_from or pub_date_to:
+        # Date range filter
+        date_from = pub_date_from if pub_date_from else "1900/01/01"
+        date_to = pub_date_to if pub_date_to else "3000/12/31"
+        query_parts.append(f'("{date_from}"[PDAT] : "{date_to}"[PDAT])')
+    
+    return " AND ".join(query_parts)
+
+async def multi_search_pubmed(queries: list, max_results: int = 10, format: str = "json", fields: list = None) -> str:
+    """
+    Run several searches at once: the esearch calls go out concurrently (the
+    shared scheduler keeps them within the rate limit), PMIDs are deduplicated
+    and the union is summarized in one batched esummary call. Results are
+    merged with reciprocal rank fusion.
+    """
+    if not queries:
+        return "Error: No queries given."
+    if len(queries) > MAX_MULTI_QUERIES:
+        return f"Error: At most {MAX_MULTI_QUERIES} queries are allowed per call."
+
+    terms = []
+    for item in queries:
+        if isinstance(item, dict):
+            if not item.get("query"):
+                return "Error: Each query object needs a 'query' field."
+            terms.append(build_advanced_query(
+                item["query"], item.get("author"), item.get("journal"),
+                item.get("pub_date_from"), item.get("pub_date_to")
+            ))
+        else:
+            terms.append(str(item))
+    logger.info(f"Multi search for {len(terms)} queries")
+
+    id_lists = await asyncio.gather(*[esearch(term, max_results) for term in terms], return_exceptions=True)
+    per_query = []
+    rankings = []
+    for term, id_list in zip(terms, id_lists):
+        if isinstance(id_list, Exception):
+            logger.error(f"Search failed for {term}: {id_list}")
+            per_query.append({"query": term, "error": str(id_list), "pmids": []})
+            continue
+        per_query.append({"query": term, "pmids": id_list})
+        rankings.append(id_list)
+
+    fused = reciprocal_rank_fusion(rankings)
+    if not fused:
+        return "No results found."
+    summaries, partial = await collect_summaries([pmid for pmid, _ in fused])
+    partial = partial or any(isinstance(id_list, DeadlineExceeded) for id_list in id_lists)
+    hit_sets = [set(entry["pmids"]) for entry in per_query]
+
+    results = []
+    for pmid, score in fused:
+        if pmid in summaries:
+            result = _search_result(summaries[pmid])
+        elif partial:
+            result = {"pmid": pmid}
+        else:
+            continue
+        result["score"] = round(score, 5)
+        result["matched_queries"] = [i for i, hits in enumerate(hit_sets) if pmid in hits]
+        results.append(result)
+    return dump_result(with_partial({"queries": per_query, "results": results}, partial), format, fields)
+
+def _title_review_type(title: str) -> str:
+    """Review type guessed from the title, for records not (yet) indexed with publication types"""
+    title_lower = title.lower()
+    if "meta-analysis" in title_lower or "metaanalysis" in title_lower:
+        return "Meta-Analysis"
+    if "systematic review" in title_lower:
+        return "Systematic Review"
+    if title_lower.startswith("review") or ": a review" in title_lower or "review article" in title_lower:
+        return "Review"
+    return ""
+
+def _similar_result(summary, score: float = None, hops: int = None, rank_score: float = None) -> dict:
+    """Result entry for get_similar_articles, flagging reviews and meta-analyses"""
+    # The title may be more specific ("systematic review") than the publication type ("Review")
+    review_type = _title_review_type(summary.title) or summary.review_type
+    paper_info = {
+        "pmid": summary.pmid,
+        "title": f"{summary.title} [{review_type}]" if review_type else summary.title,
+        "pubdate": summary.pubdate,
+        "source": summary.source,
+        "authors": [{"name": name} for name in summary.authors],
+        "is_review": bool(review_type),
+        "journal_tier": get_journal_index().tier(summary.source, summary.nlm_id)
+    }
+    if score is not None:
+        paper_info["score"] = round(score, 4)
+    if hops is not None:
+        paper_info["hops"] = hops
+    if rank_score is not None:
+        paper_info["rank_score"] = round(rank_score, 4)
+    return paper_info
+
+def _ranked_similar(candidates: list, summaries: dict, weights: dict, reranked: bool, with_hops: bool, partial: bool) -> list:
+    """Result entries for (pmid, score, hops) candidates ordered by the combined rerank score"""
+    found = [candidate for candidate in candidates if candidate[0] in summaries]
+    info = {pmid: (score, hops) for pmid, score, hops in found}
+    ranked = _rank([summaries[pmid] for pmid, _, _ in found], weights, [score for _, score, _ in found])
+    results = []
+    for summary, rank_score in ranked:
+        score, hops = info[summary.pmid]
+        results.append(_similar_result(summary, score, hops if with_hops else None, rank_score if reranked else None))
+    if partial:
+        results.extend(_unsummarized_similar(pmid, score) for pmid, score, _ in candidates if pmid not in summaries)
+    return results
+
+def _unsummarized_similar(pmid: str, score: float) -> dict:
+    """Entry for a similar article whose summary didn't arrive within the time budget"""
+    return {"pmid": pmid, "journal_tier": None, "score": round(score, 4)}
+
+def _select_similar(results: list, max_results: int, high_impact_only: bool, by_tier: bool = True) -> list:
+    """
+    Pick the final similar articles, preferring high-impact journals (best tier
+    first). With by_tier=False (custom rank weights) the given order is kept
+    and high_impact_only only filters.
+    """
+    high_impact_results = []
+    other_results = []
+    for result in results:
+        if is_high_impact_tier(result["journal_tier"]):
+            high_impact_results.append(result)
+        else:
+            other_results.append(result)
+    # Stable, so similarity order is kept within each tier
+    if by_tier:
+        high_impact_results.sort(key=lambda result: result["journal_tier"])
+    
+    # Smart fallback logic
+    if high_impact_only:
+        # Prefer high-impact journals, but fallback if too few
+        if len(high_impact_results) >= max_results // 2:
+            # If we have at least half from high-impact, use only those
+            return high_impact_results[:max_results]
+        # Not enough high-impact papers, include others
+        logger.info(f"Fallback: Only {len(high_impact_results)} high-impact papers found, including others")
+    if not by_tier:
+        return results[:max_results]
+    # No filtering, combine all results
+    return (high_impact_results + other_results)[:max_results]
+
+async def get_similar_articles(
+    pmid: str,
+    max_results: int = 5,
+    high_impact_only: bool = False,
+    depth: int = 1,
+    format: str = "json",
+    fields: list = None,
+    rank_weights: dict = None,
+    rerank_pool: int = None
+) -> str:
+    """
+    Get similar articles for a given PMID using PubMed's elink API.
+    Neighbor lists and summaries are cached, so repeated calls cost no requests.
+    depth > 1 also follows the neighbors' neighbors (one batched elink per hop).
+    Optionally filter to show only high-impact journal publications.
+    """
+    logger.info(f"Getting similar articles for PMID: {pmid}, high_impact_only: {high_impact_only}, depth: {depth}")
+    depth = max(1, min(int(depth), MAX_SIMILAR_DEPTH))
+    try:
+        weights = parse_weights(rank_weights, SIMILAR_RANK_WEIGHTS)
+    except ValueError as e:
+        return f"Error: {e}"
+    
+    try:
+        ranked = await expand_neighbors([pmid], depth)
+        # Get more candidates if filtering by high-impact journals
+        fetch_count = _pool_size(max_results * 3 if high_impact_only else max_results, rerank_pool)
+        candidates = ranked[:fetch_count]
+        if not candidates:
+            return "No similar articles found."
+        
+        summaries, partial = await collect_summaries([candidate for candidate, _, _ in candidates])
+        results = _ranked_similar(candidates, summaries, weights, bool(rank_weights), depth > 1, partial)
+        results = _select_similar(results, max_results, high_impact_only, by_tier=not rank_weights)
+        
+        if not results:
+            return "No similar articles found."
+        
+        return dump_result(with_partial(results, partial), format, fields)
+        
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting similar articles: {e}")
+        return f"Error retrieving similar articles: {str(e)}"
+
+async def get_similar_articles_batch(
+    pmids: list,
+    max_results: int = 5,
+    high_impact_only: bool = False,
+    format: str = "json",
+    fields: list = None,
+    rank_weights: dict = None,
+    rerank_pool: int = None
+) -> str:
+    """
+    Similar articles for many seed PMIDs: uncached neighbor lists come from one
+    elink request and the candidates of all seeds from one esummary request.
+    """
+    pmids = list(dict.fromkeys(str(pmid).strip() for pmid in pmids or [] if str(pmid).strip()))
+    logger.info(f"Getting similar articles for {len(pmids)} PMIDs")
+    if not pmids:
+        return "Error: No PMIDs given."
+    try:
+        weights = parse_weights(rank_weights, SIMILAR_RANK_WEIGHTS)
+    except ValueError as e:
+        return f"Error: {e}"
+    
+    neighbors = await fetch_neighbors(pmids)
+    fetch_count = _pool_size(max_results * 3 if high_impact_only else max_results, rerank_pool)
+    candidates = {pmid: neighbors.get(pmid, [])[:fetch_count] for pmid in pmids}
+    union = list(dict.fromkeys(candidate for links in candidates.values() for candidate, _ in links))
+    summaries, partial = await collect_summaries(union) if union else ({}, False)
+    
+    batch = []
+    for pmid in pmids:
+        top = max((score for _, score in candidates[pmid]), default=0) or 1
+        seed_candidates = [(candidate, score / top, None) for candidate, score in candidates[pmid]]
+        results = _ranked_similar(seed_candidates, summaries, weights, bool(rank_weights), False, partial)
+        batch.append({"pmid": pmid, "similar": _select_similar(results, max_results, high_impact_only, by_tier=not rank_weights)})
+    return dump_result(with_partial(batch, partial), format, fields)
+
+async def citation_graph(
+    pmids: list,
+    depth: int = 1,
+    direction: str = "both",
+    max_links: int = 20,
+    max_nodes: int = 500,
+    format: str = "json",
+    fields: list = None
+) -> str:
+    """
+    Citation neighborhood of the seed PMIDs, built level by level with one
+    batched elink per level and direction and summarized in one batched
+    esummary. Each node lists the PMIDs it cites within the graph.
+    """
+    pmids = list(dict.fromkeys(str(pmid).strip() for pmid in pmids or [] if str(pmid).strip()))
+    if not pmids:
+        return "Error: No PMIDs given."
+    if direction not in CITATION_DIRECTIONS:
+        return f"Error: direction must be one of {', '.join(CITATION_DIRECTIONS)}."
+    depth = max(1, min(int(depth), MAX_GRAPH_DEPTH))
+    max_nodes = max(len(pmids), min(int(max_nodes), MAX_GRAPH_NODES))
+    logger.info(f"Citation graph for {len(pmids)} PMIDs, depth {depth}, direction {direction}")
+
+    graph = await build_citation_graph(pmids, depth, CITATION_DIRECTIONS[direction], max(1, int(max_links)), max_nodes)
+    levels = graph["levels"]
+    summaries, partial = await collect_summaries(list(levels))
+
+    cites = {pmid: [] for pmid in levels}
+    cited_in_graph = dict.fromkeys(levels, 0)
+    for citing, cited in graph["edges"]:
+        cites[citing].append(cited)
+        cited_in_graph[cited] += 1
+    # Seeds first, then level by level; within a level the most cited nodes come first
+    order = sorted(levels, key=lambda pmid: (levels[pmid], -cited_in_graph[pmid]))
+    nodes = []
+    for pmid in order:
+        node = {"pmid": pmid}
+        summary = summaries.get(pmid)
+        if summary is not None:
+            node.update(title=summary.title, pubdate=summary.pubdate, source=summary.source)
+        node.update(level=levels[pmid], cited_in_graph=cited_in_graph[pmid], cites=cites[pmid])
+        nodes.append(node)
+    result = {
+        "seeds": pmids,
+        "depth": depth,
+        "direction": direction,
+        "nodes": len(nodes),
+        "edges": len(graph["edges"]),
+        "truncated": graph["truncated"],
+        "results": nodes
+    }
+    return dump_result(with_partial(result, partial or graph["partial"]), format, fields)
+
+async def search_local(
+    query: str,
+    author: str = None,
+    journal: str = None,
+    pub_date_from: str = None,
+    pub_date_to: str = None,
+    max_results: int = 10,
+    format: str = "json",
+    fields: list = None
+) -> str:
+    """Search the local full-text index of previously fetched articles (BM25, no NCBI requests)"""
+    if not local_index.enabled:
+        return "Error: The local index is disabled (PUBMED_INDEX_PATH is empty)."
+    logger.info(f"Local search - Query: {query}, Author: {author}, Journal: {journal}")
+    with timed("local_search_seconds"):
+        hits = local_index.search(query, author, journal, pub_date_from, pub_date_to, max_results)
+    if not hits:
+        return f"No results found in the local index for query: {query}"
+    results = []
+    for article, score, snippet in hits:
+        author_names = article.authors[:3]  # First 3 authors
+        results.append({
+            "pmid": article.pmid,
+            "title": article.title,
+            "authors": ", ".join(author_names) if author_names else "No authors",
+            "pubdate": article.pubdate,
+            "source": article.journal,
+            "score": round(-score, 4),
+            "snippet": snippet
+        })
+    return dump_result(results, format, fields)
+
+def metrics_snapshot() -> dict:
+    """Server metrics plus cache statistics"""
+    snapshot = metrics.snapshot()
+    snapshot["caches"] = {
+        "records": record_cache.get_stats(),
+        "searches": search_cache.get_stats(),
+        "local_index": local_index.get_stats(),
+        "prefetch": prefetch_store.get_stats()
+    }
+    return snapshot
+
+async def get_metrics(format: str = "json") -> str:
+    """Timing histograms and counters per tool and per E-utilities endpoint"""
+    if format == "prometheus":
+        lines = [metrics.prometheus().rstrip("\n"), "# TYPE pubmed_cache_stat gauge"]
+        for cache_name, stats in metrics_snapshot()["caches"].items():
+            for stat, value in stats.items():
+                lines.append(f'pubmed_cache_stat{{cache="{cache_name}",stat="{stat}"}} {value}')
+        return "\n".join(lines) + "\n"
+    return json.dumps(metrics_snapshot(), indent=2)
+
+# --- MCP Protocol Handling (shared by every transport) ---
+
+METRICS_RESOURCE_URI = "metrics://pubmed-server/metrics"
+PROTOCOL_VERSION = "2024-11-05"
+# Versions a client may negotiate; 2025-03-26 adds the Streamable HTTP transport
+SUPPORTED_PROTOCOL_VERSIONS = ("2024-11-05", "2025-03-26")
+
+# Output options accepted by every tool that returns records
+OUTPUT_PROPERTIES = {
+    "format": {"type": "string", "enum": list(FORMATS), "default": "json", "description": "Output format: json (indented), compact (minified JSON, authors as plain names), tsv or markdown (one row per record). compact/tsv/markdown use far fewer tokens."},
+    "fields": {"type": "array", "items": {"type": "string"}, "description": "Only return these fields of each record (e.g. [\"pmid\", \"title\"])"}
+}
+
+# Latency budget accepted by every tool that calls NCBI
+BUDGET_PROPERTIES = {
+    "budget_ms": {"type": "integer", "description": "Latency budget in milliseconds. When it runs out, what has been retrieved so far is returned with \"partial\": true (e.g. PMIDs without titles) instead of waiting longer."}
+}
+
+# Reranking options accepted by the search and similar-article tools
+RANK_PROPERTIES = {
+    "rank_weights": {"type": "object", "additionalProperties": {"type": "number"}, "description": f"Rerank by a weighted sum of signals, each scaled to 0-1: {', '.join(SIGNALS)} (1 = newest, halving every few years), journal (1 / high-impact tier). Negative weights penalize. Given keys override the defaults (search_pubmed: relevance 1, review -2; advanced_search_pubmed: relevance 1; similar articles: similarity 1, high-impact journals first), e.g. {{\"recency\": 0.5, \"journal\": 0.5}}. Results then include rank_score."},
+    "rerank_pool": {"type": "integer", "description": f"Retrieve and rerank this many candidates (at most {MAX_RERANK_POOL}), then return the best max_results"}
+}
+
+TOOLS = [
+    {
+        "name": "search_pubmed",
+        "description": "Search PubMed database and return REAL PMIDs with full details. CRITICAL WARNING: The PMIDs returned by this tool are the ONLY valid PMIDs. You MUST NOT generate, guess, or make up any PMIDs. NEVER cite a PMID that was not explicitly returned by this tool. Results are sorted to prioritize original research articles over reviews. Each result includes: PMID, full title, authors (first 3), publication date, journal name.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string"},
+                "max_results": {"type": "integer", "default": 5},
+                "stream": {"type": "boolean", "default": False, "description": "Send results in batches as progress notifications while they are fetched (requires a progress token)"},
+                **RANK_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "search_pubmed_paged",
+        "description": "Page through large PubMed result sets (e.g. for systematic reviews) using the NCBI History server. Returns REAL PMIDs only. CRITICAL WARNING: You MUST NOT generate or guess PMIDs. The first call takes a query and returns the total hit count, one page of results and a next_cursor; pass next_cursor back (without query) to get the following page. next_cursor is null on the last page.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search query (first page only)"},
+                "cursor": {"type": "string", "description": "next_cursor from the previous page"},
+                "page_size": {"type": "integer", "default": 20, "description": "Results per page (max 500)"},
+                "sort": {"type": "string", "enum": ["relevance", "pub_date"], "default": "relevance", "description": "Result order"},
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            }
+        }
+    },
+    {
+        "name": "multi_search_pubmed",
+        "description": "Run several PubMed searches in one call (e.g. different phrasings of one question). Returns REAL PMIDs only. CRITICAL WARNING: You MUST NOT generate or guess PMIDs. Returns the PMID list of each query and a merged ranking (reciprocal rank fusion) of the deduplicated results; matched_queries lists which queries found each paper. Prefer this over calling search_pubmed repeatedly.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "description": "Up to 10 queries: plain search strings, or objects with query/author/journal/pub_date_from/pub_date_to as in advanced_search_pubmed",
+                    "items": {
+                        "anyOf": [
+                            {"type": "string"},
+                            {
+                                "type": "object",
+                                "properties": {
+                                    "query": {"type": "string"},
+                                    "author": {"type": "string"},
+                                    "journal": {"type": "string"},
+                                    "pub_date_from": {"type": "string"},
+                                    "pub_date_to": {"type": "string"}
+                                },
+                                "required": ["query"]
+                            }
+                        ]
+                    }
+                },
+                "max_results": {"type": "integer", "default": 10, "description": "Results per query"},
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["queries"]
+        }
+    },
+    {
+        "name": "get_paper_details",
+        "description": "Get detailed information (Abstract, Authors, DOI, full-text links) for a specific PMID.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pmid": {"type": "string"},
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["pmid"]
+        }
+    },
+    {
+        "name": "get_papers_details",
+        "description": "Get detailed information (Abstract, Authors, DOI, full-text links) for many PMIDs (up to 1000) in one call. Prefer this over calling get_paper_details repeatedly. PMIDs that cannot be found are returned with an 'error' field.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pmids": {"type": "array", "items": {"type": "string"}, "description": "List of PMIDs"},
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["pmids"]
+        }
+    },
+    {
+        "name": "advanced_search_pubmed",
+        "description": "Advanced PubMed search with filters (author, journal, date range). Returns REAL PMIDs only. CRITICAL WARNING: You MUST NOT generate or guess PMIDs. ONLY use PMIDs explicitly returned by this tool. NEVER cite a PMID that was not returned. Can parse natural language like 'Smith's 2023 gastric cancer papers'.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Main search keywords"},
+                "author": {"type": "string", "description": "Author name (e.g., 'Smith J', 'Tanaka')"},
+                "journal": {"type": "string", "description": "Journal name or abbreviation (e.g., 'NEJM', 'Lancet', 'Nature')"},
+                "pub_date_from": {"type": "string", "description": "Start date in YYYY/MM/DD format"},
+                "pub_date_to": {"type": "string", "description": "End date in YYYY/MM/DD format"},
+                "max_results": {"type": "integer", "default": 5},
+                "stream": {"type": "boolean", "default": False, "description": "Send results in batches as progress notifications while they are fetched (requires a progress token)"},
+                **RANK_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "search_local",
+        "description": "Full-text search (BM25 ranking) over the titles and abstracts of articles already fetched with get_paper_details/get_papers_details, without contacting PubMed. Fast and works when PubMed is slow, but only covers papers fetched before. Returns REAL PMIDs only; you MUST NOT generate or guess PMIDs. Supports quoted phrases, AND/OR/NOT and prefix* terms.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search keywords"},
+                "author": {"type": "string", "description": "Author name (e.g., 'Smith', 'Tanaka')"},
+                "journal": {"type": "string", "description": "Journal name (substring match)"},
+                "pub_date_from": {"type": "string", "description": "Start date in YYYY/MM/DD format"},
+                "pub_date_to": {"type": "string", "description": "End date in YYYY/MM/DD format"},
+                "max_results": {"type": "integer", "default": 10},
+                **OUTPUT_PROPERTIES
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "get_similar_articles",
+        "description": "Find similar/related articles for a given PMID. Can optionally filter to show only high-impact journal publications (NEJM, Lancet, JAMA, Nature, etc.). Useful for literature review and finding related research.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pmid": {"type": "string", "description": "PMID of the reference paper"},
+                "max_results": {"type": "integer", "default": 5, "description": "Maximum number of similar articles to return"},
+                "high_impact_only": {"type": "boolean", "default": False, "description": "If true, only return articles from high-impact journals (NEJM, Lancet, JAMA, Nature, etc.)"},
+                "depth": {"type": "integer", "default": 1, "description": "1 = direct neighbors; 2-3 also follow the neighbors' neighbors (results include 'hops')"},
+                **RANK_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["pmid"]
+        }
+    },
+    {
+        "name": "get_similar_articles_batch",
+        "description": "Find similar/related articles for many PMIDs in one call (one PubMed request for all of them). Prefer this over calling get_similar_articles repeatedly. Returns, for each input PMID, its similar articles with a similarity score.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pmids": {"type": "array", "items": {"type": "string"}, "description": "PMIDs of the reference papers"},
+                "max_results": {"type": "integer", "default": 5, "description": "Maximum number of similar articles per PMID"},
+                "high_impact_only": {"type": "boolean", "default": False, "description": "If true, prefer articles from high-impact journals (NEJM, Lancet, JAMA, Nature, etc.)"},
+                **RANK_PROPERTIES,
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["pmids"]
+        }
+    },
+    {
+        "name": "citation_graph",
+        "description": "Build the citation network around one or more PMIDs: articles citing them (cited_by) and/or their references, expanded level by level up to `depth`. The whole graph costs one PubMed request per level and direction plus one for titles, so prefer this over chaining get_similar_articles/get_paper_details per PMID. Returns one node per article (title, date, journal, level = distance from the seeds, cited_in_graph) with `cites` listing the graph PMIDs it references.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pmids": {"type": "array", "items": {"type": "string"}, "description": "Seed PMIDs"},
+                "depth": {"type": "integer", "default": 1, "description": "Levels to expand (1-3)"},
+                "direction": {"type": "string", "enum": list(CITATION_DIRECTIONS), "default": "both", "description": "cited_by (newer articles citing the node), references (older articles it cites) or both"},
+                "max_links": {"type": "integer", "default": 20, "description": "Links followed per article and direction"},
+                "max_nodes": {"type": "integer", "default": 500, "description": f"Stop adding articles at this many nodes (at most {MAX_GRAPH_NODES}); the result then has truncated: true"},
+                **OUTPUT_PROPERTIES,
+                **BUDGET_PROPERTIES
+            },
+            "required": ["pmids"]
+        }
+    },
+    {
+        "name": "get_metrics",
+        "description": "Server performance metrics: latency histograms per tool and per PubMed E-utilities endpoint, queueing, parsing and serialization time, bytes transferred and cache statistics.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "format": {"type": "string", "enum": ["json", "prometheus"], "default": "json", "description": "Output format"}
+            }
+        }
+    }
+]
+
+async def call_tool(name: str, args: dict, progress=None) -> str:
+    """Run a tool by name with its JSON arguments and return the text result"""
+    current_tool.set(name)
+    started = time.perf_counter()
+    budget_ms = args.get("budget_ms") or DEFAULT_BUDGET_MS
+    set_deadline(budget_ms / 1000 if budget_ms else None)
+    try:
+        result_content = await _dispatch_tool(name, args, progress)
+    except DeadlineExceeded:
+        metrics.inc("tool_deadline_exceeded_total", tool=name)
+        if budget_ms:
+            logger.warning(f"{name} ran out of its {budget_ms} ms budget")
+            result_content = f"Error: {name} could not retrieve anything within the time budget of {budget_ms} ms."
+        else:
+            logger.warning(f"{name} hit a deadline without a budget")
+            result_content = f"Error: {name} timed out waiting for PubMed."
+
+    metrics.observe("tool_seconds", time.perf_counter() - started, tool=name)
+    metrics.observe("tool_response_bytes", len(result_content.encode("utf-8")), buckets=BYTES_BUCKETS, tool=name)
+    return result_content
+
+async def _dispatch_tool(name: str, args: dict, progress=None) -> str:
+    if name == "search_pubmed":
+        result_content = await search_pubmed(
+            args.get("query"),
+            args.get("max_results", 5),
+            stream=args.get("stream", False),
+            progress=progress,
+            format=args.get("format", "json"),
+            fields=args.get("fields"),
+            rank_weights=args.get("rank_weights"),
+            rerank_pool=args.get("rerank_pool")
+        )
+    elif name == "search_pubmed_paged":
+        result_content = await search_pubmed_paged(
+            query=args.get("query"),
+            cursor=args.get("cursor"),
+            page_size=args.get("page_size", 20),
+            sort=args.get("sort", "relevance"),
+            format=args.get("format", "json"),
+            fields=args.get("fields")
+        )
+    elif name == "multi_search_pubmed":
+        result_content = await multi_search_pubmed(
+            queries=args.get("queries"),
+            max_results=args.get("max_results", 10),
+            format=args.get("format", "json"),
+            fields=args.get("fields")
+        )
+    elif name == "get_paper_details":
+        result_content = await get_paper_details(args.get("pmid"), args.get("format", "json"), args.get("fields"))
+    elif name == "get_papers_details":
+        result_content = await get_papers_details(args.get("pmids"), args.get("format", "json"), args.get("fields"))
+    elif name == "advanced_search_pubmed":
+        result_content = await advanced_search_pubmed(
+            query=args.get("query"),
+            author=args.get("author"),
+            journal=args.get("journal"),
+            pub_date_from=args.get("pub_date_from"),
+            pub_date_to=args.get("pub_date_to"),
+            max_results=args.get("max_results", 5),
+            stream=args.get("stream", False),
+            progress=progress,
+            format=args.get("format", "json"),
+            fields=args.get("fields"),
+            rank_weights=args.get("rank_weights"),
+            rerank_pool=args.get("rerank_pool")
+        )
+    elif name == "search_local":
+        result_content = await search_local(
+            query=args.get("query"),
+            author=args.get("author"),
+            journal=args.get("journal"),
+            pub_date_from=args.get("pub_date_from"),
+            pub_date_to=args.get("pub_date_to"),
+            max_results=args.get("max_results", 10),
+            format=args.get("format", "json"),
+            fields=args.get("fields")
+        )
+    elif name == "get_similar_articles":
+        result_content = await get_similar_articles(
+            pmid=args.get("pmid"),
+            max_results=args.get("max_results", 5),
+            high_impact_only=args.get("high_impact_only", False),
+            depth=args.get("depth", 1),
+            format=args.get("format", "json"),
+            fields=args.get("fields"),
+            rank_weights=args.get("rank_weights"),
+            rerank_pool=args.get("rerank_pool")
+        )
+    elif name == "get_similar_articles_batch":
+        result_content = await get_similar_articles_batch(
+            pmids=args.get("pmids"),
+            max_results=args.get("max_results", 5),
+            high_impact_only=args.get("high_impact_only", False),
+            format=args.get("format", "json"),
+            fields=args.get("fields"),
+            rank_weights=args.get("rank_weights"),
+            rerank_pool=args.get("rerank_pool")
+        )
+    elif name == "citation_graph":
+        result_content = await citation_graph(
+            pmids=args.get("pmids"),
+            depth=args.get("depth", 1),
+            direction=args.get("direction", "both"),
+            max_links=args.get("max_links", 20),
+            max_nodes=args.get("max_nodes", 500),
+            format=args.get("format", "json"),
+            fields=args.get("fields")
+        )
+    elif name == "get_metrics":
+        result_content = await get_metrics(args.get("format", "json"))
+    else:
+        raise ValueError(f"Unknown tool: {name}")
+    return result_content
+
+def progress_reporter(progress_token, send):
+    """Return a callback that sends notifications/progress for the token through `send`, or None without one"""
+    if progress_token is None:
+        return None
+
+    async def report(progress, total, message=None):
+        notification = {
+            "jsonrpc": "2.0",
+            "method": "notifications/progress",
+            "params": {
+                "progressToken": progress_token,
+                "progress": progress,
+                "total": total
+            }
+        }
+        if message is not None:
+            notification["params"]["message"] = message
+        await send(notification)
+
+    return report
+
+# tools/list result, serialized once on first use
+_tools_list_json = None
+
+def encode_message(message) -> str:
+    """JSON text of an outgoing message; strings are already serialized (see _tools_list_response)"""
+    return message if isinstance(message, str) else json.dumps(message, ensure_ascii=False)
+
+def _tools_list_response(msg_id) -> str:
+    """The tools/list response, pre-serialized: the schemas never change while the server runs"""
+    global _tools_list_json
+    if _tools_list_json is None:
+        _tools_list_json = json.dumps({"tools": TOOLS}, ensure_ascii=False)
+    return f'{{"jsonrpc": "2.0", "id": {json.dumps(msg_id)}, "result": {_tools_list_json}}}'
+
+async def handle_message(message, send, flow=None, session=None):
+    """
+    Handle one JSON-RPC message, passing responses and notifications to the
+    `send` coroutine. `flow` keys the request for fair scheduling of upstream
+    calls (defaults to the JSON-RPC id; transports serving several clients
+    pass something unique per client) and `session` identifies the client for
+    work that outlives the request, such as prefetches. Messages passed to
+    `send` are dicts or already serialized JSON strings (see encode_message).
+    """
+    msg_id = message.get("id")
+    current_session.set(session)
+    try:
+        if "method" not in message:
+            return
+        
+        method = message["method"]
+
+        if method == "initialize":
+            # No upstream work here: the HTTP client is warmed by startup() or opened on first use
+            requested = message.get("params", {}).get("protocolVersion")
+            response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "result": {
+                    "protocolVersion": requested if requested in SUPPORTED_PROTOCOL_VERSIONS else PROTOCOL_VERSION,
+                    "capabilities": {
+                        "tools": {},
+                        "resources": {}
+                    },
+                    "serverInfo": {
+                        "name": "pubmed-server",
+                        "version": "0.1.0"
+                    }
+                }
+            }
+            await send(response)
+
+        elif method == "tools/list":
+            await send(_tools_list_response(msg_id))
+
+        elif method == "tools/call":
+            params = message.get("params", {})
+            set_flow(msg_id if flow is None else flow)
+            progress = progress_reporter(params.get("_meta", {}).get("progressToken"), send)
+            result_content = await call_tool(params.get("name"), params.get("arguments", {}), progress)
+
+            response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "result": {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": result_content
+                        }
+                    ]
+                }
+            }
+            await send(response)
+
+        elif method == "resources/list":
+            response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "result": {
+                    "resources": [
+                        {
+                            "uri": METRICS_RESOURCE_URI,
+                            "name": "metrics",
+                            "description": "Server performance metrics and cache statistics",
+                            "mimeType": "application/json"
+                        }
+                    ]
+                }
+            }
+            await send(response)
+
+        elif method == "resources/read":
+            uri = message.get("params", {}).get("uri")
+            if uri != METRICS_RESOURCE_URI:
+                raise ValueError(f"Unknown resource: {uri}")
+            response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "result": {
+                    "contents": [
+                        {
+                            "uri": uri,
+                            "mimeType": "application/json",
+                            "text": json.dumps(metrics_snapshot(), indent=2)
+                        }
+                    ]
+                }
+            }
+            await send(response)
+            
+        elif method == "ping":
+            await send({"jsonrpc": "2.0", "id": msg_id, "result": {}})
+
+        elif method == "notifications/initialized":
+            pass # No response needed
+
+        else:
+            # Ignore other methods for now
+            pass
+
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+        if msg_id is not None:
+            error_response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "error": {
+                    "code": -32603,
+                    "message": str(e)
+                }
+            }
+            await send(error_response)
+
+async def startup():
+    """
+    Warm shared state: HTTP connection pool and journal index. Loading httpx
+    runs in a worker thread, so the stdio server does this in the background
+    while it answers initialize.
+    """
+    await open_client()
+    get_journal_index()
+
+def end_session(session):
+    """Drop background work started for a client session that has ended"""
+    prefetch_store.cancel(session)
+
+async def shutdown():
+    """Release the HTTP client and on-disk stores"""
+    prefetch_store.cancel_all()
+    await close_client()
+    record_cache.close()
+    local_index.close()
+    logger.info(f"Search cache stats: {search_cache.get_stats()}")
+    if prefetch_store.enabled:
+        logger.info(f"Prefetch stats: {prefetch_store.get_stats()}")
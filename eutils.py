@@ -0,0 +1,452 @@
+from __future__ import annotations  # httpx annotations; the module is imported lazily
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from metrics import metrics, timed, current_tool
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Overridable so benchmarks can point the server at a local E-utilities stand-in
+BASE_URL = os.environ.get("PUBMED_EUTILS_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+API_KEY = os.environ.get("NCBI_API_KEY")
+
+# Connection pool settings for the shared client
+MAX_CONNECTIONS = int(os.environ.get("PUBMED_HTTP_MAX_CONNECTIONS", "10"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("PUBMED_HTTP_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.environ.get("PUBMED_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2 = os.environ.get("PUBMED_HTTP2", "").lower() in ("1", "true", "yes")
+CONNECT_TIMEOUT = float(os.environ.get("PUBMED_HTTP_CONNECT_TIMEOUT", "5"))
+
+# Read timeouts (seconds) per E-utilities endpoint; efetch/elink responses are larger and slower
+ENDPOINT_TIMEOUTS = {
+    "esearch.fcgi": float(os.environ.get("PUBMED_ESEARCH_TIMEOUT", "15")),
+    "esummary.fcgi": float(os.environ.get("PUBMED_ESUMMARY_TIMEOUT", "15")),
+    "efetch.fcgi": float(os.environ.get("PUBMED_EFETCH_TIMEOUT", "30")),
+    "elink.fcgi": float(os.environ.get("PUBMED_ELINK_TIMEOUT", "30")),
+}
+DEFAULT_TIMEOUT = 30.0
+
+# NCBI allows 3 requests/second without an API key and 10 with one
+RATE_LIMIT = float(os.environ.get("PUBMED_RATE_LIMIT", "10" if API_KEY else "3"))
+# Tokens that may accumulate while idle; 1 spaces requests evenly so no 1s window exceeds the limit
+RATE_BURST = float(os.environ.get("PUBMED_RATE_BURST", "1"))
+MAX_RETRIES = int(os.environ.get("PUBMED_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Send a duplicate ("hedged") request when one takes longer than this quantile of
+# recent latencies for its endpoint; 0 disables hedging
+HEDGE_QUANTILE = float(os.environ.get("PUBMED_HEDGE_QUANTILE", "0.95"))
+# Upper bound on hedged requests as a share of all requests (hedges use rate-limit slots)
+HEDGE_MAX_RATIO = float(os.environ.get("PUBMED_HEDGE_MAX_RATIO", "0.1"))
+# Latencies kept per endpoint and needed before hedging starts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+# Slack added to the 1s window so network jitter can't push rate+1 requests into one second at NCBI
+WINDOW_MARGIN = 0.05
+
+# Interactive lookups (get_paper_details) are scheduled ahead of bulk search/link traffic
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+_client = None
+_current_flow = contextvars.ContextVar("eutils_flow", default=None)
+_current_deadline = contextvars.ContextVar("eutils_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """The latency budget of the current tool call ran out before an E-utilities request finished"""
+
+class LatencyTracker:
+    """Sliding window of recent successful request latencies per endpoint"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}  # endpoint -> deque of seconds
+        self._quantiles = {}  # (endpoint, q) -> (samples seen when computed, value)
+        self._seen = {}
+
+    def record(self, endpoint: str, seconds: float):
+        self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+        self._seen[endpoint] = self._seen.get(endpoint, 0) + 1
+
+    def quantile(self, endpoint: str, q: float) -> float:
+        """q-quantile of the window, or None before HEDGE_MIN_SAMPLES requests completed"""
+        samples = self._samples.get(endpoint)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        seen = self._seen[endpoint]
+        cached = self._quantiles.get((endpoint, q))
+        # Re-sorting the window every 10 samples is plenty for a hedging threshold
+        if cached is None or seen - cached[0] >= 10:
+            ordered = sorted(samples)
+            cached = (seen, ordered[min(len(ordered) - 1, int(q * len(ordered)))])
+            self._quantiles[(endpoint, q)] = cached
+        return cached[1]
+
+latencies = LatencyTracker()
+_hedge_counts = {"requests": 0, "hedged": 0}
+
+class RequestScheduler:
+    """
+    Token-bucket scheduler that every E-utilities request goes through.
+    Waiters are served by priority, then round-robin across flows (one flow per
+    tool call) so a single bulk call cannot starve concurrent ones.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Grant times within the last second; guards the per-second cap at window edges
+        self._window = deque()
+        self._queues = {}  # priority -> OrderedDict(flow -> deque of futures)
+        self._wakeup = None
+        self._task = None
+
+    async def acquire(self, priority: int = PRIORITY_BULK, flow=None):
+        """Wait until a request slot is granted"""
+        waiter = asyncio.get_running_loop().create_future()
+        flows = self._queues.setdefault(priority, OrderedDict())
+        flows.setdefault(flow, deque()).append(waiter)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        await waiter
+
+    def pause(self, seconds: float):
+        """Stop granting slots for a while (e.g. after HTTP 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _ensure_dispatcher(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    def _has_waiters(self) -> bool:
+        for flows in self._queues.values():
+            for flow in list(flows):
+                waiters = flows[flow]
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if not waiters:
+                    del flows[flow]
+        return any(self._queues.values())
+
+    def _next_waiter(self):
+        for priority in sorted(self._queues):
+            flows = self._queues[priority]
+            if flows:
+                flow, waiters = next(iter(flows.items()))
+                waiter = waiters.popleft()
+                # Rotate the flow to the back of its priority level
+                if waiters:
+                    flows.move_to_end(flow)
+                else:
+                    del flows[flow]
+                return waiter
+        return None
+
+    async def _dispatch(self):
+        while True:
+            if not self._has_waiters():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            while self._window and now - self._window[0] >= 1.0 + WINDOW_MARGIN:
+                self._window.popleft()
+            if len(self._window) >= max(1, int(self.rate)):
+                await asyncio.sleep(1.0 + WINDOW_MARGIN - (now - self._window[0]))
+                continue
+            self._window.append(now)
+            # _has_waiters() pruned cancelled waiters and nothing awaited since
+            self._tokens -= 1
+            self._next_waiter().set_result(None)
+
+scheduler = RequestScheduler(RATE_LIMIT, RATE_BURST)
+
+def get_params(base_params: dict) -> dict:
+    """Helper to add API key to params if available"""
+    if API_KEY:
+        base_params["api_key"] = API_KEY
+    return base_params
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package (pip install httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# httpx and the TLS context are loaded on first use (see load_httpx)
+httpx = None
+_ssl_context = None
+_load_lock = threading.Lock()
+
+def load_httpx():
+    """
+    Import httpx and build the TLS context for the client. Together they take
+    a few hundred milliseconds, most of a cold start, so they are not loaded
+    at import time and open_client does it in a worker thread.
+    """
+    global httpx, _ssl_context
+    with _load_lock:
+        if httpx is None:
+            import httpx
+        if _ssl_context is None:
+            _ssl_context = httpx.create_ssl_context()
+
+def get_client() -> httpx.AsyncClient:
+    """Return the process-wide client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        load_httpx()
+        http2 = HTTP2 and _http2_available()
+        if HTTP2 and not http2:
+            logger.warning("PUBMED_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            http2=http2,
+            verify=_ssl_context,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        logger.info(f"Opened E-utilities client (http2={http2}, max_connections={MAX_CONNECTIONS})")
+    return _client
+
+async def open_client() -> httpx.AsyncClient:
+    """Create the shared client, loading httpx off the event loop"""
+    await asyncio.to_thread(load_httpx)
+    return get_client()
+
+async def close_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    scheduler.close()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Closed E-utilities client")
+
+def set_flow(key):
+    """Tag E-utilities requests made from the current task with a flow key (e.g. the JSON-RPC id)"""
+    _current_flow.set(key)
+
+def set_deadline(seconds: float = None):
+    """Give E-utilities requests made from the current task a budget of `seconds` from now (None: no limit)"""
+    _current_deadline.set(time.monotonic() + seconds if seconds else None)
+
+def remaining_time() -> float:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def deadline_exceeded() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+async def _within_deadline(awaitable, limit: float = None):
+    """Await with a timeout of `limit` or the time left before the deadline, whichever is shorter"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        awaitable.close()
+        raise DeadlineExceeded("Time budget exhausted")
+    timeout = limit if remaining is None else min(remaining, limit or remaining)
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if deadline_exceeded():
+            raise DeadlineExceeded("Time budget exhausted") from None
+        raise
+
+def _retry_after(resp: httpx.Response):
+    """Seconds to wait according to a Retry-After header, if present"""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def _hedge_delay(endpoint: str) -> float:
+    """Seconds after which a request to `endpoint` gets a hedged duplicate, or None not to hedge"""
+    if HEDGE_QUANTILE <= 0 or _hedge_counts["hedged"] >= HEDGE_MAX_RATIO * _hedge_counts["requests"]:
+        return None
+    delay = latencies.quantile(endpoint, HEDGE_QUANTILE)
+    return None if delay is None else max(delay, HEDGE_MIN_DELAY)
+
+async def _timed_send(client: httpx.AsyncClient, build_request, stream: bool, endpoint: str, tool) -> httpx.Response:
+    started = time.perf_counter()
+    # For streamed responses this covers time to headers; the body is read by the caller
+    with timed("eutils_request_seconds", endpoint=endpoint, tool=tool):
+        resp = await client.send(build_request(), stream=stream)
+    latencies.record(endpoint, time.perf_counter() - started)
+    return resp
+
+def _close_unused(task: asyncio.Task):
+    """Done callback for a losing request: release its response"""
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
+
+async def _send(client: httpx.AsyncClient, build_request, stream: bool, endpoint: str, tool, priority: int, flow) -> httpx.Response:
+    """
+    Send one attempt. If it is still outstanding after the endpoint's recent
+    HEDGE_QUANTILE latency, an identical request is sent (through the rate
+    limiter) and whichever response arrives first is used.
+    """
+    _hedge_counts["requests"] += 1
+    delay = _hedge_delay(endpoint)
+    primary = asyncio.ensure_future(_timed_send(client, build_request, stream, endpoint, tool))
+    if delay is None:
+        return await primary
+
+    async def hedge():
+        # The original already waited its turn, so the duplicate goes ahead of queued bulk requests
+        await scheduler.acquire(PRIORITY_INTERACTIVE, flow)
+        return await _timed_send(client, build_request, stream, endpoint, tool)
+
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            _hedge_counts["hedged"] += 1
+            metrics.inc("eutils_hedged_total", endpoint=endpoint, tool=tool)
+            logger.info(f"{endpoint} slower than {delay:.2f}s, sending hedged request")
+            tasks.add(asyncio.ensure_future(hedge()))
+        error = None
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    if task is not primary:
+                        metrics.inc("eutils_hedge_wins_total", endpoint=endpoint, tool=tool)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+            task.add_done_callback(_close_unused)
+
+async def _request(method: str, endpoint: str, params: dict, priority: int, stream: bool = False) -> httpx.Response:
+    """
+    Send a request to an E-utilities endpoint through the shared client.
+    Requests are rate limited by the scheduler, hedged when unusually slow and
+    retried on throttling, server errors and transport failures, all within
+    the deadline set for the current tool call (DeadlineExceeded once it
+    passes). With stream=True the body is left unread and the caller must
+    close the response.
+    """
+    client = get_client()
+    request_params = get_params(dict(params))
+    flow = _current_flow.get()
+    if flow is None:
+        flow = asyncio.current_task()
+    tool = current_tool.get()
+    for attempt in range(MAX_RETRIES + 1):
+        with timed("eutils_queue_seconds", endpoint=endpoint, tool=tool):
+            await _within_deadline(scheduler.acquire(priority, flow))
+        limit = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        remaining = remaining_time()
+        timeout = httpx.Timeout(limit if remaining is None else max(0.001, min(limit, remaining)), connect=CONNECT_TIMEOUT)
+        if method == "POST":
+            build_request = lambda: client.build_request("POST", f"/{endpoint}", data=request_params, timeout=timeout)
+        else:
+            build_request = lambda: client.build_request("GET", f"/{endpoint}", params=request_params, timeout=timeout)
+        try:
+            # The read timeout applies per chunk, so also bound the whole exchange (a trickling response can't stall the call)
+            resp = await _within_deadline(_send(client, build_request, stream, endpoint, tool, priority, flow), limit)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            metrics.inc("eutils_requests_total", endpoint=endpoint, status=type(e).__name__)
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff(attempt)
+            _check_budget(delay)
+            logger.warning(f"{endpoint} request failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        metrics.inc("eutils_requests_total", endpoint=endpoint, status=resp.status_code)
+        if not stream:
+            metrics.inc("eutils_response_bytes_total", len(resp.content), endpoint=endpoint, tool=tool)
+        if resp.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+            break
+        await resp.aclose()
+        delay = _retry_after(resp)
+        if delay is None:
+            delay = _backoff(attempt)
+        _check_budget(delay)
+        logger.warning(f"{endpoint} returned HTTP {resp.status_code}, retrying in {delay:.1f}s")
+        if resp.status_code == 429:
+            # Throttling applies to the whole process, so hold back every request
+            scheduler.pause(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    if resp.is_error:
+        await resp.aclose()
+        resp.raise_for_status()
+    return resp
+
+def _check_budget(delay: float):
+    """Give up instead of sleeping past the deadline"""
+    remaining = remaining_time()
+    if remaining is not None and delay >= remaining:
+        raise DeadlineExceeded("Time budget exhausted while retrying")
+
+async def eutils_get(endpoint: str, params: dict, priority: int = PRIORITY_BULK) -> httpx.Response:
+    """GET an E-utilities endpoint (e.g. 'esearch.fcgi')"""
+    return await _request("GET", endpoint, params, priority)
+
+async def eutils_post(endpoint: str, params: dict, priority: int = PRIORITY_BULK) -> httpx.Response:
+    """POST to an E-utilities endpoint; NCBI recommends POST for long ID lists"""
+    return await _request("POST", endpoint, params, priority)
+
+async def eutils_stream(endpoint: str, params: dict, priority: int = PRIORITY_BULK, method: str = "GET") -> httpx.Response:
+    """Send a request and return the response with its body unread (use aiter_bytes(), then aclose())"""
+    return await _request(method, endpoint, params, priority, stream=True)
+
+def response_json(resp: httpx.Response):
+    """Decode a JSON response, recording the time spent parsing"""
+    endpoint = resp.request.url.path.rsplit("/", 1)[-1]
+    with timed("parse_seconds", format="json", endpoint=endpoint, tool=current_tool.get()):
+        return resp.json()
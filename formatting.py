@@ -0,0 +1,125 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Output formats accepted by the tools' `format` argument
+FORMATS = ("json", "compact", "tsv", "markdown")
+
+def parse_fields(fields) -> list:
+    """Accept a list of field names or a comma-separated string"""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [str(field).strip() for field in fields if str(field).strip()] or None
+
+def _table_rows(obj):
+    """(rows, meta) for tabular output: list results become rows, other top-level keys become metadata"""
+    if isinstance(obj, list):
+        return obj, {}
+    if isinstance(obj, dict) and isinstance(obj.get("results"), list):
+        return obj["results"], {k: v for k, v in obj.items() if k != "results"}
+    return [obj], {}
+
+def project(obj, fields: list):
+    """Keep only the requested keys of each record (unknown field names are ignored)"""
+    if not fields:
+        return obj
+    if isinstance(obj, dict) and isinstance(obj.get("results"), list):
+        return {**obj, "results": project(obj["results"], fields)}
+    if isinstance(obj, list):
+        return [project(item, fields) for item in obj]
+    if isinstance(obj, dict):
+        return {field: obj[field] for field in fields if field in obj}
+    return obj
+
+def _compact_record(record):
+    """Author lists of {"name": ...} objects become plain name strings"""
+    if not isinstance(record, dict):
+        return record
+    authors = record.get("authors")
+    if isinstance(authors, list) and authors and isinstance(authors[0], dict):
+        return {**record, "authors": [author.get("name", "") for author in authors]}
+    return record
+
+def _compact(obj):
+    if isinstance(obj, list):
+        return [_compact_record(item) for item in obj]
+    if isinstance(obj, dict) and isinstance(obj.get("results"), list):
+        return {**obj, "results": _compact(obj["results"])}
+    return _compact_record(obj)
+
+def _cell(value) -> str:
+    """Flatten a value into one table cell"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        # Tabs and line breaks would split the row
+        if "\t" in value or "\n" in value or "\r" in value:
+            return " ".join(value.split())
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return "; ".join(_cell(item) for item in value)
+    if isinstance(value, dict):
+        if "name" in value and len(value) == 1:
+            return _cell(value["name"])
+        return " ".join(_cell(item) for item in value.values())
+    return str(value)
+
+def _columns(rows: list) -> list:
+    columns = []
+    for row in rows:
+        for key in (row if isinstance(row, dict) else {}):
+            if key not in columns:
+                columns.append(key)
+    return columns
+
+def to_tsv(obj) -> str:
+    rows, meta = _table_rows(obj)
+    columns = _columns(rows)
+    lines = [f"# {key}: {_cell(value)}" for key, value in meta.items()]
+    lines.append("\t".join(columns))
+    for row in rows:
+        lines.append("\t".join(_cell(row.get(column)) for column in columns))
+    return "\n".join(lines)
+
+def to_markdown(obj) -> str:
+    rows, meta = _table_rows(obj)
+    columns = _columns(rows)
+    lines = [f"**{key}**: {_cell(value)}  " for key, value in meta.items()]
+    if lines:
+        lines.append("")
+    lines.append("| " + " | ".join(columns) + " |")
+    lines.append("|" + "---|" * len(columns))
+    for row in rows:
+        lines.append("| " + " | ".join(_cell(row.get(column)).replace("|", "\\|") for column in columns) + " |")
+    return "\n".join(lines)
+
+def to_json(obj, indent: bool = True) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def render(obj, format: str = "json", fields=None) -> str:
+    """
+    Render a tool result.
+    json: indented JSON (default), compact: minified JSON with author objects
+    flattened to names, tsv / markdown: one row per record.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format: {format} (expected one of {', '.join(FORMATS)})")
+    obj = project(obj, parse_fields(fields))
+    if format == "json":
+        return to_json(obj)
+    if format == "compact":
+        return to_json(_compact(obj), indent=False)
+    if format == "tsv":
+        return to_tsv(obj)
+    return to_markdown(obj)
@@ -0,0 +1,146 @@
+"""
+Load PubMed baseline / update files into the local article store.
+
+Download the yearly baseline (and optionally the daily updatefiles) from
+https://ftp.ncbi.nlm.nih.gov/pubmed/ and point this script at the directory:
+
+    python ingest.py ~/pubmed/baseline ~/pubmed/updatefiles --workers 4
+
+Each .xml.gz file is decompressed and parsed incrementally in a worker process;
+parsed records are sent back in batches and written to the store at
+PUBMED_INDEX_PATH, which get_paper_details and search_local consult before
+contacting NCBI. Files are numbered in name order so records from later update
+files win, and <DeleteCitation> entries remove withdrawn PMIDs.
+"""
+import os
+import sys
+import glob
+import gzip
+import time
+import logging
+import argparse
+import multiprocessing
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor
+
+from pubmed_xml import ArticleStreamParser
+from local_index import LocalIndex, INDEX_PATH
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("pubmed-mcp")
+
+# Compressed bytes read per parser feed
+CHUNK_SIZE = 1024 * 1024
+# Batches waiting to be written before workers pause
+QUEUE_BATCHES = 16
+# Seconds without a batch before checking whether a worker died
+POLL_INTERVAL = 5
+
+def find_files(paths: list) -> list:
+    """Every .xml.gz / .xml file under the given files or directories, in name order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.xml.gz")))
+            files.extend(glob.glob(os.path.join(path, "*.xml")))
+        else:
+            files.append(path)
+    return sorted(set(files), key=os.path.basename)
+
+def parse_file(path: str, revision: int, queue, batch_size: int):
+    """Worker: stream one file and put ("articles" | "deleted", revision, items) batches on the queue"""
+    opener = gzip.open if path.endswith(".gz") else open
+    parser = ArticleStreamParser()
+    batch = []
+    count = 0
+    try:
+        with opener(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                records = parser.feed(chunk) if chunk else parser.close()
+                batch.extend(records)
+                if len(batch) >= batch_size or (not chunk and batch):
+                    queue.put(("articles", revision, batch))
+                    count += len(batch)
+                    batch = []
+                if not chunk:
+                    break
+        if parser.deleted:
+            queue.put(("deleted", revision, parser.deleted))
+        queue.put(("done", revision, (path, count, len(parser.deleted), None)))
+    except Exception as e:
+        queue.put(("done", revision, (path, count, len(parser.deleted), f"{type(e).__name__}: {e}")))
+
+def ingest(paths: list, index_path: str = INDEX_PATH, workers: int = None, batch_size: int = 1000) -> dict:
+    files = find_files(paths)
+    if not files:
+        raise SystemExit(f"No .xml.gz files found in {', '.join(paths)}")
+    store = LocalIndex(index_path)
+    if not store.enabled:
+        raise SystemExit("PUBMED_INDEX_PATH is empty; set it or pass --index")
+    workers = workers or max(1, min(len(files), (os.cpu_count() or 2) - 1))
+    logger.info(f"Ingesting {len(files)} files into {index_path} with {workers} workers")
+
+    totals = {"files": 0, "articles": 0, "deleted": 0, "errors": 0}
+    started = time.perf_counter()
+    last_report = started
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = manager.Queue(QUEUE_BATCHES)
+        futures = {
+            revision: pool.submit(parse_file, path, revision, queue, batch_size)
+            for revision, path in enumerate(files, start=1)
+        }
+        while totals["files"] < len(files):
+            try:
+                kind, revision, payload = queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                # A worker killed (e.g. out of memory) or a failed submit never reports "done"
+                for revision, future in list(futures.items()):
+                    if future.done() and future.exception() is not None:
+                        del futures[revision]
+                        totals["files"] += 1
+                        totals["errors"] += 1
+                        logger.error(f"Failed to ingest {files[revision - 1]}: {type(future.exception()).__name__}: {future.exception()}")
+                continue
+            if kind == "articles":
+                store.add_many(payload, revision)
+                totals["articles"] += len(payload)
+            elif kind == "deleted":
+                totals["deleted"] += store.delete_many(payload, revision)
+            else:
+                path, count, deleted, error = payload
+                futures.pop(revision, None)
+                totals["files"] += 1
+                if error:
+                    totals["errors"] += 1
+                    logger.error(f"Failed to ingest {path} after {count} records: {error}")
+                else:
+                    logger.info(f"Finished {os.path.basename(path)}: {count} records, {deleted} deletions")
+            now = time.perf_counter()
+            if now - last_report >= 10:
+                last_report = now
+                logger.info(f"{totals['articles']} records ({totals['articles'] / (now - started):.0f} records/s), "
+                            f"{totals['files']}/{len(files)} files")
+
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = round(elapsed, 1)
+    totals["records_per_second"] = round(totals["articles"] / elapsed) if elapsed else 0
+    totals["store_articles"] = store.get_stats()["articles"]
+    store.close()
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Baseline/update .xml.gz files or directories containing them")
+    parser.add_argument("--index", default=INDEX_PATH, help="Article store path (default: PUBMED_INDEX_PATH)")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count - 1)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records per write transaction")
+    args = parser.parse_args()
+
+    totals = ingest(args.paths, args.index, args.workers, args.batch_size)
+    print(f"Ingested {totals['articles']} records from {totals['files']} files in {totals['seconds']}s "
+          f"({totals['records_per_second']} records/s); {totals['deleted']} deleted, {totals['errors']} failed files; "
+          f"store now holds {totals['store_articles']} articles")
+
+if __name__ == "__main__":
+    main()
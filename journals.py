@@ -0,0 +1,94 @@
+import os
+import re
+import csv
+import logging
+from functools import lru_cache
+from dataclasses import dataclass
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Journal list with tiers; PUBMED_JOURNALS_FILE replaces the bundled journals.tsv
+JOURNALS_FILE = os.environ.get(
+    "PUBMED_JOURNALS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "journals.tsv"),
+)
+# Journals at this tier or better count as high-impact
+HIGH_IMPACT_MAX_TIER = int(os.environ.get("PUBMED_HIGH_IMPACT_MAX_TIER", "2"))
+
+@dataclass(frozen=True, slots=True)
+class JournalInfo:
+    """One journal of the classification list"""
+    abbreviation: str
+    tier: int
+    score: float = None
+
+@lru_cache(maxsize=4096)
+def normalize_journal(name: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so "N. Engl. J. Med." == "N Engl J Med" """
+    return " ".join(re.sub(r"[^\w&]+", " ", name.lower()).split())
+
+class JournalIndex:
+    """
+    Exact-match lookup of journals by NLM unique ID, ISSN, ISO abbreviation,
+    title or alias. Every key is normalized once when the list is loaded, so a
+    lookup is a dict access regardless of how many journals the list holds.
+    """
+
+    def __init__(self, journals: dict = None):
+        self.journals = journals or {}  # normalized key -> JournalInfo
+
+    @classmethod
+    def from_file(cls, path: str) -> "JournalIndex":
+        """
+        Load a TSV (or .csv) file with columns abbreviation, title, nlm_id, issn,
+        tier, score and aliases ("|"-separated). Only abbreviation and tier are required.
+        """
+        journals = {}
+        delimiter = "," if path.endswith(".csv") else "\t"
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f, delimiter=delimiter):
+                abbreviation = (row.get("abbreviation") or "").strip()
+                if not abbreviation:
+                    continue
+                try:
+                    tier = int(row.get("tier") or 0)
+                    score = float(row["score"]) if row.get("score") else None
+                except ValueError:
+                    logger.warning(f"Skipping journal with invalid tier/score: {abbreviation}")
+                    continue
+                info = JournalInfo(abbreviation, tier, score)
+                keys = [abbreviation, row.get("title"), row.get("nlm_id"), row.get("issn")]
+                keys.extend((row.get("aliases") or "").split("|"))
+                for key in keys:
+                    if key and key.strip():
+                        journals.setdefault(normalize_journal(key.strip()), info)
+        logger.info(f"Loaded {len(set(journals.values()))} journals from {path}")
+        return cls(journals)
+
+    def lookup(self, name: str = None, nlm_id: str = None) -> JournalInfo:
+        """JournalInfo for a journal given by NLM ID and/or name, or None if it isn't listed"""
+        if nlm_id:
+            info = self.journals.get(normalize_journal(nlm_id))
+            if info is not None:
+                return info
+        if name:
+            return self.journals.get(normalize_journal(name))
+        return None
+
+    def tier(self, name: str = None, nlm_id: str = None) -> int:
+        """Tier of the journal (1 = top); None for unlisted journals"""
+        info = self.lookup(name, nlm_id)
+        return info.tier if info is not None else None
+
+def is_high_impact_tier(tier: int) -> bool:
+    """Whether a tier from JournalIndex.tier counts as high impact"""
+    return tier is not None and 0 < tier <= HIGH_IMPACT_MAX_TIER
+
+@lru_cache(maxsize=1)
+def get_journal_index() -> JournalIndex:
+    """The journal index, loaded from JOURNALS_FILE on first use"""
+    try:
+        return JournalIndex.from_file(JOURNALS_FILE)
+    except OSError as e:
+        logger.error(f"Could not load journal list {JOURNALS_FILE}: {e}")
+        return JournalIndex()
@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+from models import Article
+from cache import CACHE_MAX_ENTRIES, SQL_BATCH_SIZE
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Full-text index of every article fetched with efetch; set PUBMED_INDEX_PATH to an empty string to disable it
+INDEX_PATH = os.environ.get(
+    "PUBMED_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "mcp-pubmed-server", "index.sqlite3"),
+)
+
+# Seconds the server waits on a database locked by another writer (e.g. an ingest run) before giving up
+SERVER_BUSY_TIMEOUT = 0.2
+
+# BM25 column weights: title, abstract, authors, journal
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+FTS_OPERATORS = {"AND", "OR", "NOT"}
+
+def sortable_date(pubdate: str) -> str:
+    """"2023 Jan 5" / "2023 Jan-Feb" / "2023/01/05" -> "2023/01/05" ("" if there is no year)"""
+    year = re.search(r"\b(\d{4})\b", pubdate or "")
+    if not year:
+        return ""
+    rest = pubdate[year.end():]
+    month = 0
+    day = 0
+    numbers = re.findall(r"\d{1,2}", rest)
+    name = re.search(r"[A-Za-z]{3}", rest)
+    if name and name.group(0).lower() in MONTHS:
+        month = MONTHS[name.group(0).lower()]
+        day = int(numbers[0]) if numbers else 0
+    elif numbers:
+        month = int(numbers[0])
+        day = int(numbers[1]) if len(numbers) > 1 else 0
+    return f"{year.group(1)}/{month:02d}/{day:02d}"
+
+def _date_bound(value: str, upper: bool) -> str:
+    """Filter bound in sortable form; missing month/day widen the range"""
+    parts = re.findall(r"\d+", value or "")
+    if not parts:
+        return None
+    default = 12 if upper else 0
+    month = int(parts[1]) if len(parts) > 1 else default
+    day = int(parts[2]) if len(parts) > 2 else (31 if upper else 0)
+    return f"{int(parts[0]):04d}/{month:02d}/{day:02d}"
+
+def fts_query(text: str) -> str:
+    """
+    Turn a free-text or PubMed-style query into an FTS5 expression: quoted phrases
+    and AND/OR/NOT are kept, field tags like [Title] are dropped and every other
+    word is quoted so punctuation can't break the syntax.
+    """
+    text = re.sub(r"\[[^\]]*\]", " ", text or "")
+    tokens = []
+    for phrase, word in re.findall(r'"([^"]*)"|([\w*]+)', text):
+        if phrase.strip():
+            tokens.append('"' + phrase.replace('"', "") + '"')
+        elif word in FTS_OPERATORS:
+            if tokens and tokens[-1] not in FTS_OPERATORS:
+                tokens.append(word)
+        elif word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if word:
+                tokens.append(f'"{word}"' + ("*" if prefix else ""))
+    while tokens and tokens[-1] in FTS_OPERATORS:
+        tokens.pop()
+    return " ".join(tokens)
+
+class LocalIndex:
+    """
+    SQLite FTS5 index over the title, abstract, authors and journal of fetched
+    or bulk-ingested articles. Searches are ranked with BM25 and never touch NCBI.
+    Each row records the `revision` it came from (the ordinal of the baseline/update
+    file, 0 for efetch results) so files ingested out of order can't overwrite
+    newer data, and withdrawn PMIDs leave a tombstone so an older file finishing
+    later can't bring them back. Rows from efetch are bounded like the record
+    cache (oldest dropped beyond `max_fetched`); ingested rows are kept.
+    """
+
+    def __init__(self, path: str, max_fetched: int = CACHE_MAX_ENTRIES, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_fetched = max_fetched
+        self.busy_timeout = busy_timeout
+        self.stats = {"hits": 0}
+        self._conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                " id INTEGER PRIMARY KEY, pmid TEXT NOT NULL UNIQUE, title TEXT, abstract TEXT,"
+                " authors TEXT, journal TEXT, sort_date TEXT, data TEXT NOT NULL,"
+                " revision INTEGER NOT NULL DEFAULT 0);"
+                "CREATE INDEX IF NOT EXISTS articles_sort_date ON articles (sort_date);"
+                # PMIDs withdrawn by an update file (<DeleteCitation>) and the revision that withdrew them
+                "CREATE TABLE IF NOT EXISTS deleted (pmid TEXT PRIMARY KEY, revision INTEGER NOT NULL);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+                " title, abstract, authors, journal,"
+                " content='articles', content_rowid='id', tokenize='porter unicode61');"
+                # Keep the external-content FTS table in step with the articles table
+                "CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN"
+                " INSERT INTO articles_fts (rowid, title, abstract, authors, journal)"
+                " VALUES (new.id, new.title, new.abstract, new.authors, new.journal); END;"
+                "CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN"
+                " INSERT INTO articles_fts (articles_fts, rowid, title, abstract, authors, journal)"
+                " VALUES ('delete', old.id, old.title, old.abstract, old.authors, old.journal);"
+                " INSERT INTO articles_fts (rowid, title, abstract, authors, journal)"
+                " VALUES (new.id, new.title, new.abstract, new.authors, new.journal); END;"
+                "CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN"
+                " INSERT INTO articles_fts (articles_fts, rowid, title, abstract, authors, journal)"
+                " VALUES ('delete', old.id, old.title, old.abstract, old.authors, old.journal); END;"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(articles)")}
+            if "revision" not in columns:
+                # Index created before bulk ingestion existed
+                self._conn.execute("ALTER TABLE articles ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS articles_revision ON articles (revision)")
+            logger.info(f"Opened local index at {self.path}")
+        return self._conn
+
+    def add_many(self, articles, revision: int = 0):
+        """Insert or refresh Articles (rows from a later revision, and PMIDs withdrawn by one, are kept)"""
+        if not self.enabled:
+            return
+        rows = [
+            (
+                article.pmid, article.title, article.abstract, "; ".join(article.authors),
+                article.journal, sortable_date(article.pubdate),
+                json.dumps(article.to_dict(), ensure_ascii=False), revision
+            )
+            for article in articles
+        ]
+        if not rows:
+            return
+        conn = self._connect()
+        conn.executemany(
+            "INSERT INTO articles (pmid, title, abstract, authors, journal, sort_date, data, revision)"
+            " SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8"
+            " WHERE NOT EXISTS (SELECT 1 FROM deleted WHERE pmid = ?1 AND revision >= ?8)"
+            " ON CONFLICT (pmid) DO UPDATE SET title = excluded.title, abstract = excluded.abstract,"
+            " authors = excluded.authors, journal = excluded.journal,"
+            " sort_date = excluded.sort_date, data = excluded.data, revision = excluded.revision"
+            " WHERE excluded.revision >= articles.revision",
+            rows,
+        )
+        if revision == 0:
+            excess = conn.execute("SELECT COUNT(*) FROM articles WHERE revision = 0").fetchone()[0] - self.max_fetched
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM articles WHERE id IN (SELECT id FROM articles WHERE revision = 0 ORDER BY id LIMIT ?)",
+                    (excess,),
+                )
+        conn.commit()
+
+    def delete_many(self, pmids: list, revision: int = 0) -> int:
+        """
+        Withdraw PMIDs deleted by an update file, unless a later revision re-added
+        them. The tombstone also applies to rows of earlier files that arrive
+        later. Returns the number of PMIDs withdrawn.
+        """
+        if not self.enabled or not pmids:
+            return 0
+        conn = self._connect()
+        params = [(pmid, revision) for pmid in pmids]
+        conn.executemany(
+            "INSERT INTO deleted (pmid, revision) VALUES (?, ?)"
+            " ON CONFLICT (pmid) DO UPDATE SET revision = max(revision, excluded.revision)",
+            params,
+        )
+        conn.executemany("DELETE FROM articles WHERE pmid = ? AND revision <= ?", params)
+        conn.commit()
+        return len(params)
+
+    def get_many(self, pmids: list, ingested_only: bool = False) -> dict:
+        """Return {pmid: Article} for the PMIDs held locally (only bulk-ingested rows with ingested_only)"""
+        if not self.enabled or not pmids:
+            return {}
+        if self._conn is None and not os.path.exists(self.path):
+            return {}
+        conn = self._connect()
+        pmids = list(pmids)
+        found = {}
+        for start in range(0, len(pmids), SQL_BATCH_SIZE):
+            batch = pmids[start:start + SQL_BATCH_SIZE]
+            sql = f"SELECT pmid, data FROM articles WHERE pmid IN ({','.join('?' * len(batch))})"
+            if ingested_only:
+                sql += " AND revision > 0"
+            found.update((pmid, Article.from_dict(json.loads(data))) for pmid, data in conn.execute(sql, batch))
+        self.stats["hits"] += len(found)
+        return found
+
+    def search(
+        self,
+        query: str,
+        author: str = None,
+        journal: str = None,
+        pub_date_from: str = None,
+        pub_date_to: str = None,
+        limit: int = 10
+    ) -> list:
+        """Return (Article, score, snippet) tuples, best match first (lower BM25 score is better)"""
+        if not self.enabled:
+            return []
+        expression = fts_query(query)
+        if author:
+            author_terms = fts_query(author)
+            if author_terms:
+                expression = f"({expression}) AND authors : ({author_terms})" if expression else f"authors : ({author_terms})"
+        if not expression:
+            return []
+        sql = (
+            "SELECT a.data, bm25(articles_fts, ?, ?, ?, ?) AS score,"
+            " snippet(articles_fts, 1, '**', '**', '...', 24)"
+            " FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid"
+            " WHERE articles_fts MATCH ?"
+        )
+        params = [*BM25_WEIGHTS, expression]
+        if journal:
+            sql += " AND a.journal LIKE ?"
+            params.append(f"%{journal}%")
+        date_from = _date_bound(pub_date_from, upper=False)
+        if date_from:
+            sql += " AND a.sort_date >= ?"
+            params.append(date_from)
+        date_to = _date_bound(pub_date_to, upper=True)
+        if date_to:
+            sql += " AND a.sort_date != '' AND a.sort_date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        try:
+            rows = self._connect().execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid local search query: {query} ({e})") from e
+        return [(Article.from_dict(json.loads(data)), score, snippet) for data, score, snippet in rows]
+
+    def get_stats(self) -> dict:
+        if not self.enabled or (self._conn is None and not os.path.exists(self.path)):
+            return {"articles": 0, **self.stats}
+        count = self._connect().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        return {"articles": count, **self.stats}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+local_index = LocalIndex(INDEX_PATH, busy_timeout=SERVER_BUSY_TIMEOUT)
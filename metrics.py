@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Set PUBMED_OTEL=1 to also emit OpenTelemetry spans (requires opentelemetry-api and an SDK/exporter)
+OTEL_ENABLED = os.environ.get("PUBMED_OTEL", "").lower() in ("1", "true", "yes")
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Name of the tool being executed, so upstream calls can be attributed to it
+current_tool = contextvars.ContextVar("current_tool", default=None)
+
+class Histogram:
+    """Fixed-bucket histogram with count/sum/max and bucket-based quantile estimates"""
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the observed max for the overflow bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max, 6)
+        }
+
+def _escape_label(value) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsRegistry:
+    """In-process counters and histograms keyed by metric name and label set"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> float
+
+    def observe(self, name: str, value: float, buckets: tuple = SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        histograms = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            histograms.setdefault(name, []).append({"labels": dict(labels), **histogram.to_dict()})
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "histograms": histograms,
+            "counters": counters
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        typed = set()
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"pubmed_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{label_text(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"pubmed_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{metric}_sum{label_text(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+_tracer = None
+
+def _get_tracer():
+    global _tracer, OTEL_ENABLED
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("PUBMED_OTEL is set but opentelemetry is not installed; tracing disabled")
+            OTEL_ENABLED = False
+            return None
+        _tracer = trace.get_tracer("pubmed-mcp")
+    return _tracer
+
+@contextmanager
+def timed(name: str, **labels):
+    """Record the duration of the block in the `name` histogram (and an OpenTelemetry span if enabled)"""
+    tracer = _get_tracer() if OTEL_ENABLED else None
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            metrics.observe(name, time.perf_counter() - start, **labels)
+        return
+    attributes = {k: str(v) for k, v in labels.items() if v is not None}
+    with tracer.start_as_current_span(name, attributes=attributes):
+        try:
+            yield
+        finally:
+            metrics.observe(name, time.perf_counter() - start, **labels)
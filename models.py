@@ -0,0 +1,137 @@
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+def _intern(value: str) -> str:
+    """Share one copy of strings that repeat across many records (journal names, publication types)"""
+    return sys.intern(value) if value else value
+
+@lru_cache(maxsize=1024)
+def _review_type(pub_types: tuple) -> str:
+    """"Meta-Analysis", "Systematic Review" or "Review" according to the publication types, else "" """
+    types = [pub_type.lower() for pub_type in pub_types]
+    if "meta-analysis" in types:
+        return "Meta-Analysis"
+    if "systematic review" in types:
+        return "Systematic Review"
+    if any("review" in pub_type for pub_type in types):
+        return "Review"
+    return ""
+
+@dataclass(slots=True)
+class Article:
+    """Detail record for one PMID (efetch)"""
+    pmid: str
+    title: str = "No title"
+    authors: tuple = ()
+    journal: str = ""
+    doi: str = None
+    pmc_id: str = None
+    abstract: str = ""
+    pubdate: str = ""
+
+    def __post_init__(self):
+        self.journal = _intern(self.journal)
+
+    @property
+    def links(self) -> dict:
+        links = {
+            "pubmed": f"https://pubmed.ncbi.nlm.nih.gov/{self.pmid}/"
+        }
+        if self.pmc_id:
+            links["pmc"] = f"https://www.ncbi.nlm.nih.gov/pmc/articles/{self.pmc_id}/"
+        if self.doi:
+            links["doi"] = f"https://doi.org/{self.doi}"
+        return links
+
+    def to_dict(self) -> dict:
+        return {
+            "pmid": self.pmid,
+            "title": self.title,
+            "authors": list(self.authors),
+            "journal": self.journal,
+            "doi": self.doi,
+            "pmc_id": self.pmc_id,
+            "abstract": self.abstract,
+            "pubdate": self.pubdate,
+            "links": self.links
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Article":
+        return cls(
+            pmid=data["pmid"],
+            title=data.get("title", "No title"),
+            authors=tuple(data.get("authors", ())),
+            journal=data.get("journal", ""),
+            doi=data.get("doi"),
+            pmc_id=data.get("pmc_id"),
+            abstract=data.get("abstract", ""),
+            pubdate=data.get("pubdate", ""),
+        )
+
+@dataclass(slots=True)
+class ArticleSummary:
+    """Summary record for one PMID (esummary)"""
+    pmid: str
+    title: str = "No title"
+    authors: tuple = ()
+    pubdate: str = "Unknown date"
+    source: str = "Unknown source"
+    pub_types: tuple = ()
+    nlm_id: str = ""
+
+    def __post_init__(self):
+        self.source = _intern(self.source)
+        self.nlm_id = _intern(self.nlm_id)
+        self.pub_types = tuple(_intern(pub_type) for pub_type in self.pub_types)
+
+    @property
+    def review_type(self) -> str:
+        """"Meta-Analysis", "Systematic Review" or "Review" according to the publication types, else "" """
+        return _review_type(self.pub_types)
+
+    @property
+    def is_review(self) -> bool:
+        return bool(self.review_type)
+
+    def to_dict(self) -> dict:
+        return {
+            "pmid": self.pmid,
+            "title": self.title,
+            "authors": list(self.authors),
+            "pubdate": self.pubdate,
+            "source": self.source,
+            "pub_types": list(self.pub_types),
+            "nlm_id": self.nlm_id
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ArticleSummary":
+        return cls(
+            pmid=data["pmid"],
+            title=data.get("title", "No title"),
+            authors=tuple(data.get("authors", ())),
+            pubdate=data.get("pubdate", "Unknown date"),
+            source=data.get("source", "Unknown source"),
+            pub_types=tuple(data.get("pub_types", ())),
+            nlm_id=data.get("nlm_id", ""),
+        )
+
+    @classmethod
+    def from_esummary(cls, pmid: str, item: dict) -> "ArticleSummary":
+        """Build from one entry of an esummary JSON 'result' object"""
+        authors = tuple(
+            author.get("name", "")
+            for author in item.get("authors", [])
+            if isinstance(author, dict)
+        )
+        return cls(
+            pmid=pmid,
+            title=item.get("title", "No title"),
+            authors=authors,
+            pubdate=item.get("pubdate", "Unknown date"),
+            source=item.get("source", "Unknown source"),
+            pub_types=tuple(item.get("pubtype", [])),
+            nlm_id=item.get("nlmuniqueid", ""),
+        )
@@ -0,0 +1,376 @@
+import os
+import json
+import base64
+import asyncio
+import logging
+import sqlite3
+from eutils import (
+    eutils_get, eutils_post, eutils_stream, response_json, set_deadline, remaining_time, deadline_exceeded, DeadlineExceeded,
+    PRIORITY_INTERACTIVE, PRIORITY_BULK
+)
+from cache import record_cache, search_cache, prefetch_store
+from local_index import local_index
+from models import Article, ArticleSummary
+from pubmed_xml import iter_articles
+from metrics import metrics, current_tool
+
+logger = logging.getLogger("pubmed-mcp")
+
+# Maximum number of PMIDs per efetch request
+EFETCH_BATCH_SIZE = int(os.environ.get("PUBMED_EFETCH_BATCH_SIZE", "200"))
+# ID lists longer than this are POSTed to avoid URL length limits
+POST_ID_THRESHOLD = 200
+# Largest page served from the History server in one esummary call
+MAX_PAGE_SIZE = 500
+# esummary batch size when search results are streamed as progress notifications
+STREAM_BATCH_SIZE = int(os.environ.get("PUBMED_STREAM_BATCH_SIZE", "20"))
+# Neighbors kept per PMID in the similar-articles cache
+MAX_NEIGHBORS = 200
+# Citation links kept per PMID and direction in the cache
+MAX_CITATION_LINKS = 1000
+# elink link names for each citation direction
+CITATION_LINKS = {"cited_by": "pubmed_pubmed_citedin", "references": "pubmed_pubmed_refs"}
+# Weight applied per extra hop when expanding multi-hop neighborhoods
+HOP_DECAY = 0.5
+# Damping constant for reciprocal rank fusion (the value from Cormack et al.)
+RRF_K = 60
+
+async def esearch(term: str, max_results: int) -> list:
+    """Run esearch (relevance order) and return the PMID list, using the in-memory search cache"""
+    async def fetch():
+        # Shared by every concurrent caller of the query, so no single caller's deadline applies
+        set_deadline(None)
+        search_params = {
+            "db": "pubmed",
+            "term": term,
+            "retmode": "json",
+            "retmax": max_results,
+            "sort": "relevance"
+        }
+        resp = await eutils_get("esearch.fcgi", search_params)
+        return response_json(resp).get("esearchresult", {}).get("idlist", [])
+
+    try:
+        return await search_cache.get_or_fetch(term, "relevance", max_results, fetch, remaining_time())
+    except asyncio.TimeoutError:
+        if deadline_exceeded():
+            raise DeadlineExceeded("Time budget exhausted") from None
+        raise
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """
+    Merge several ranked PMID lists. Each list contributes 1 / (k + rank) per PMID;
+    returns (pmid, score) pairs, best first (ties keep first-seen order).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, pmid in enumerate(ranking, start=1):
+            scores[pmid] = scores.get(pmid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def cached_summaries(pmids: list) -> dict:
+    """ArticleSummary objects for the PMIDs in the record cache"""
+    return {
+        pmid: ArticleSummary.from_dict(data)
+        for pmid, data in record_cache.get_many("article_summary", pmids).items()
+    }
+
+async def fetch_summaries(pmids: list) -> dict:
+    """Get ArticleSummary objects keyed by PMID, fetching only those missing from the record cache"""
+    summaries = cached_summaries(pmids)
+    missing = [pmid for pmid in pmids if pmid not in summaries]
+    if missing:
+        summary_params = {
+            "db": "pubmed",
+            "id": ",".join(missing),
+            "retmode": "json"
+        }
+        if len(missing) > POST_ID_THRESHOLD:
+            resp = await eutils_post("esummary.fcgi", summary_params)
+        else:
+            resp = await eutils_get("esummary.fcgi", summary_params)
+        result = response_json(resp).get("result", {})
+        fetched = {
+            pmid: ArticleSummary.from_esummary(pmid, result[pmid])
+            for pmid in missing
+            if pmid in result and "error" not in result[pmid]
+        }
+        record_cache.put_many("article_summary", {pmid: summary.to_dict() for pmid, summary in fetched.items()})
+        summaries.update(fetched)
+    return summaries
+
+async def iter_summary_batches(pmids: list, batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Fetch summaries in batches concurrently and yield (batch_pmids, summaries)
+    as each batch completes, so callers can use early batches immediately.
+    """
+    batches = [pmids[i:i + batch_size] for i in range(0, len(pmids), batch_size)]
+
+    async def fetch(batch):
+        return batch, await fetch_summaries(batch)
+
+    tasks = [asyncio.ensure_future(fetch(batch)) for batch in batches]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _parse_linkset(linkset: dict, linkname: str = "pubmed_pubmed", limit: int = MAX_NEIGHBORS) -> list:
+    """(pmid, score) pairs of the `linkname` links in one elink linkset (score 0 without cmd=neighbor_score)"""
+    for db in linkset.get("linksetdbs", []):
+        if db.get("linkname") == linkname:
+            links = []
+            for link in db.get("links", [])[:limit]:
+                if isinstance(link, dict):
+                    links.append((str(link.get("id", "")), int(link.get("score", 0))))
+                else:
+                    links.append((str(link), 0))
+            return links
+    return []
+
+async def _fetch_links(pmids: list, linkname: str, cmd: str, kind: str, limit: int) -> dict:
+    """
+    {pmid: [(linked_pmid, score), ...]} for one elink link name, without the
+    PMID itself. Lists are cached per PMID as `kind`; all misses go out in a
+    single elink request (one `id` parameter per PMID, so NCBI returns a
+    separate linkset for each).
+    """
+    links = {
+        pmid: [tuple(link) for link in data["links"]]
+        for pmid, data in record_cache.get_many(kind, pmids).items()
+    }
+    missing = list(dict.fromkeys(pmid for pmid in pmids if pmid not in links))
+    if missing:
+        elink_params = {
+            "dbfrom": "pubmed",
+            "db": "pubmed",
+            "id": missing,
+            "cmd": cmd,
+            "linkname": linkname,
+            "retmode": "json"
+        }
+        request = eutils_post if len(missing) > POST_ID_THRESHOLD else eutils_get
+        resp = await request("elink.fcgi", elink_params)
+        fetched = {pmid: [] for pmid in missing}  # PMIDs without a linkset have no links
+        for linkset in response_json(resp).get("linksets", []):
+            ids = [str(pmid) for pmid in linkset.get("ids", [])]
+            if ids and ids[0] in fetched:
+                fetched[ids[0]] = [link for link in _parse_linkset(linkset, linkname, limit) if link[0] != ids[0]]
+        record_cache.put_many(kind, {pmid: {"links": pmid_links} for pmid, pmid_links in fetched.items()})
+        links.update(fetched)
+    return links
+
+async def fetch_neighbors(pmids: list) -> dict:
+    """Similar articles from elink neighbor_score: {pmid: [(neighbor_pmid, score), ...]}, best first"""
+    return await _fetch_links(pmids, "pubmed_pubmed", "neighbor_score", "neighbors", MAX_NEIGHBORS)
+
+async def fetch_citations(pmids: list, direction: str) -> dict:
+    """{pmid: [pmid, ...]} of the articles citing ("cited_by") or cited by ("references") each PMID"""
+    links = await _fetch_links(pmids, CITATION_LINKS[direction], "neighbor", direction, MAX_CITATION_LINKS)
+    return {pmid: [linked for linked, _ in pmid_links] for pmid, pmid_links in links.items()}
+
+async def build_citation_graph(seeds: list, depth: int = 1, directions: tuple = ("cited_by", "references"),
+                               max_links: int = 20, max_nodes: int = 500) -> dict:
+    """
+    Breadth-first citation graph around the seeds. Each level is expanded with
+    one batched elink request per direction, so the request count grows with
+    depth, not with the number of nodes. Up to `max_links` links per node and
+    direction are followed and the graph stops growing at `max_nodes`.
+
+    Returns {"levels": {pmid: level}, "edges": [(citing, cited), ...],
+    "truncated": bool, "partial": bool}; partial means the latency budget ran
+    out after at least one complete level.
+    """
+    levels = {pmid: 0 for pmid in seeds}
+    edges = {}  # (citing, cited) -> None, keeps insertion order
+    truncated = partial = False
+    frontier = list(levels)
+    for level in range(1, depth + 1):
+        try:
+            results = await asyncio.gather(*[fetch_citations(frontier, direction) for direction in directions])
+        except DeadlineExceeded:
+            if level == 1:
+                raise
+            partial = True
+            break
+        next_frontier = []
+        for direction, links in zip(directions, results):
+            for pmid in frontier:
+                for other in links.get(pmid, [])[:max_links]:
+                    if other not in levels:
+                        if len(levels) >= max_nodes:
+                            truncated = True
+                            continue
+                        levels[other] = level
+                        next_frontier.append(other)
+                    edges[(other, pmid) if direction == "cited_by" else (pmid, other)] = None
+        frontier = next_frontier
+        if not frontier:
+            break
+    return {"levels": levels, "edges": list(edges), "truncated": truncated, "partial": partial}
+
+async def expand_neighbors(seeds: list, depth: int = 1, fanout: int = 10) -> list:
+    """
+    Multi-hop similarity: the top `fanout` neighbors of each hop are expanded
+    in turn, one batched elink call per hop at most. Neighbor scores are
+    normalized per list and multiplied along each path (times HOP_DECAY for
+    every hop after the first); a candidate's score is the sum over all paths
+    reaching it. Returns (pmid, score, hops) best first.
+    """
+    seen = set(seeds)
+    scores = {}
+    hops = {}
+    frontier = {pmid: 1.0 for pmid in seeds}
+    for hop in range(1, depth + 1):
+        neighbors = await fetch_neighbors(list(frontier))
+        decay = 1.0 if hop == 1 else HOP_DECAY
+        next_frontier = {}
+        for pmid, weight in frontier.items():
+            links = neighbors.get(pmid, [])
+            top = max((score for _, score in links), default=0) or 1
+            for rank, (neighbor, score) in enumerate(links):
+                if neighbor in seen:
+                    continue
+                # Lists without scores fall back to rank order
+                value = weight * decay * (score / top if score else 1.0 / (rank + 1))
+                scores[neighbor] = scores.get(neighbor, 0.0) + value
+                hops.setdefault(neighbor, hop)
+                if rank < fanout:
+                    next_frontier[neighbor] = max(next_frontier.get(neighbor, 0.0), value)
+        seen.update(next_frontier)
+        frontier = next_frontier
+        if not frontier:
+            break
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(pmid, score, hops[pmid]) for pmid, score in ranked]
+
+async def esearch_history(term: str, sort: str = "relevance") -> dict:
+    """
+    Run esearch on the NCBI History server. Returns the hit count and the
+    WebEnv/query_key pair that later esummary/efetch calls page through.
+    """
+    search_params = {
+        "db": "pubmed",
+        "term": term,
+        "retmode": "json",
+        "retmax": 0,
+        "sort": sort,
+        "usehistory": "y"
+    }
+    resp = await eutils_get("esearch.fcgi", search_params)
+    result = response_json(resp).get("esearchresult", {})
+    return {
+        "count": int(result.get("count", 0)),
+        "webenv": result.get("webenv"),
+        "query_key": result.get("querykey")
+    }
+
+async def fetch_summaries_page(webenv: str, query_key: str, retstart: int, retmax: int) -> list:
+    """
+    esummary one page of a History server result set, in result order.
+    Returns None when NCBI no longer knows the WebEnv (it expires after inactivity).
+    """
+    summary_params = {
+        "db": "pubmed",
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": retmax,
+        "retmode": "json"
+    }
+    resp = await eutils_get("esummary.fcgi", summary_params)
+    data = response_json(resp)
+    result = data.get("result")
+    if result is None:
+        logger.info(f"History server page unavailable: {data.get('error') or data.get('esummaryresult')}")
+        return None
+    summaries = [
+        ArticleSummary.from_esummary(pmid, result[pmid])
+        for pmid in result.get("uids", [])
+        if pmid in result and "error" not in result[pmid]
+    ]
+    record_cache.put_many("article_summary", {summary.pmid: summary.to_dict() for summary in summaries})
+    return summaries
+
+def encode_cursor(state: dict) -> str:
+    """Opaque pagination cursor handed back to the client"""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor; ValueError unless the cursor holds a complete search state"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not (
+        isinstance(state, dict)
+        and isinstance(state.get("query"), str) and state["query"]
+        and isinstance(state.get("sort"), str)
+        and isinstance(state.get("retstart"), int) and state["retstart"] >= 0
+        and isinstance(state.get("page_size"), int)
+        # History server state, present from the first page on
+        and (not state.get("webenv") or (isinstance(state.get("query_key"), str) and isinstance(state.get("count"), int)))
+    ):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return state
+
+async def _efetch_batch(pmids: list, priority: int) -> dict:
+    """efetch one batch of PMIDs, parsing articles incrementally as the response streams in"""
+    fetch_params = {"db": "pubmed", "id": ",".join(pmids), "retmode": "xml"}
+    resp = await eutils_stream("efetch.fcgi", fetch_params, priority=priority, method="GET" if len(pmids) == 1 else "POST")
+    articles = {}
+    try:
+        async for article in iter_articles(resp.aiter_bytes()):
+            articles[article.pmid] = article
+    finally:
+        metrics.inc("eutils_response_bytes_total", resp.num_bytes_downloaded, endpoint="efetch.fcgi", tool=current_tool.get())
+        await resp.aclose()
+    return articles
+
+async def fetch_articles(pmids: list, priority: int = PRIORITY_INTERACTIVE, allow_partial: bool = False) -> dict:
+    """
+    Get Article objects keyed by PMID. Prefetched records are used first, then
+    the local article store (bulk-ingested corpus) and the record cache; the
+    rest are fetched in efetch batches. With allow_partial, batches that miss
+    the deadline are left out instead of failing the whole call.
+    """
+    # A prefetch runs without a deadline, so wait for it only as long as this call's budget allows
+    articles = await prefetch_store.get_many(pmids, remaining_time())
+    missing = [pmid for pmid in pmids if pmid not in articles]
+    if missing:
+        articles.update(await _load_articles(missing, priority, allow_partial))
+    return articles
+
+def prefetch_articles(pmids: list, owner=None):
+    """Fetch details of the first PREFETCH_TOP_K PMIDs in the background so a follow-up lookup is a memory hit"""
+    return prefetch_store.schedule(pmids, _prefetch, owner)
+
+async def _prefetch(pmids: list) -> dict:
+    current_tool.set("prefetch")
+    # Runs past the response, so the search call's deadline doesn't apply
+    set_deadline(None)
+    return await _load_articles(pmids, PRIORITY_BULK)
+
+async def _load_articles(pmids: list, priority: int, allow_partial: bool = False) -> dict:
+    # Ingested records first; articles indexed from efetch go through the record cache so its TTL applies
+    articles = local_index.get_many(pmids, ingested_only=True)
+    cached = record_cache.get_many("article", [pmid for pmid in pmids if pmid not in articles])
+    articles.update((pmid, Article.from_dict(data)) for pmid, data in cached.items())
+    missing = list(dict.fromkeys(pmid for pmid in pmids if pmid not in articles))
+    if missing:
+        batches = [missing[i:i + EFETCH_BATCH_SIZE] for i in range(0, len(missing), EFETCH_BATCH_SIZE)]
+        for fetched in await asyncio.gather(*[_efetch_batch(batch, priority) for batch in batches], return_exceptions=True):
+            if isinstance(fetched, DeadlineExceeded) and allow_partial:
+                continue
+            if isinstance(fetched, BaseException):
+                raise fetched
+            record_cache.put_many("article", {pmid: article.to_dict() for pmid, article in fetched.items()})
+            try:
+                local_index.add_many(fetched.values())
+            except sqlite3.Error as e:
+                # The articles were fetched; only the local search index misses them
+                logger.warning(f"Could not add {len(fetched)} articles to the local index: {e}")
+            articles.update(fetched)
+    return articles
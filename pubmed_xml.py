@@ -0,0 +1,136 @@
+import time
+import logging
+from xml.etree.ElementTree import XMLPullParser
+from models import Article
+from metrics import metrics, current_tool
+
+logger = logging.getLogger("pubmed-mcp")
+
+def _text(elem) -> str:
+    """All text inside an element, including inline markup such as <i> or <sup>"""
+    if elem is None:
+        return ""
+    return "".join(elem.itertext()).strip()
+
+def _pubdate(article) -> str:
+    """Journal issue date in esummary style ("2023 Jan 5"), or the free-text MedlineDate"""
+    pub_date = article.find("Journal/JournalIssue/PubDate")
+    if pub_date is None:
+        return ""
+    medline_date = pub_date.findtext("MedlineDate")
+    if medline_date:
+        return medline_date.strip()
+    parts = [pub_date.findtext(tag) for tag in ("Year", "Month", "Day")]
+    return " ".join(part.strip() for part in parts if part)
+
+def parse_article_element(pubmed_article) -> Article:
+    """Build the Article for one <PubmedArticle> element"""
+    citation = pubmed_article.find("MedlineCitation")
+    pmid = _text(citation.find("PMID"))
+    article = citation.find("Article")
+
+    title = _text(article.find("ArticleTitle")) or "No title"
+    abstract_text = "\n".join(_text(section) for section in article.iterfind("Abstract/AbstractText"))
+
+    authors = []
+    for author in article.iterfind("AuthorList/Author"):
+        last_name = author.findtext("LastName")
+        fore_name = author.findtext("ForeName")
+        if last_name and fore_name:
+            authors.append(f"{last_name} {fore_name}")
+
+    doi = None
+    pmc_id = None
+    for article_id in pubmed_article.iterfind("PubmedData/ArticleIdList/ArticleId"):
+        id_type = article_id.get("IdType")
+        if id_type == "doi":
+            doi = article_id.text
+        elif id_type == "pmc":
+            pmc_id = article_id.text
+    if not doi:
+        # Some records only carry the DOI as an electronic location
+        for eloc in article.iterfind("ELocationID"):
+            if eloc.get("EIdType") == "doi":
+                doi = eloc.text
+                break
+
+    return Article(
+        pmid=pmid,
+        title=title,
+        authors=tuple(authors),
+        journal=article.findtext("Journal/Title", ""),
+        doi=doi,
+        pmc_id=pmc_id,
+        abstract=abstract_text,
+        pubdate=_pubdate(article),
+    )
+
+class ArticleStreamParser:
+    """
+    Incremental parser for efetch PubmedArticleSet XML.
+    Feed it byte chunks as they arrive; each completed <PubmedArticle> is
+    turned into an Article and dropped from the tree, so memory use stays flat
+    regardless of how many records the response holds. PMIDs listed in
+    <DeleteCitation> (baseline update files) are collected in `deleted`.
+    """
+
+    def __init__(self):
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._root = None
+        self.deleted = []
+
+    def feed(self, chunk: bytes) -> list:
+        """Parse a chunk and return the articles completed by it"""
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list:
+        records = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag == "PubmedArticle":
+                try:
+                    records.append(parse_article_element(elem))
+                except AttributeError as e:
+                    logger.error(f"Error parsing PubmedArticle: {e}")
+                self._root.clear()
+            elif elem.tag == "PubmedBookArticle":
+                self._root.clear()
+            elif elem.tag == "DeleteCitation":
+                self.deleted.extend(_text(pmid) for pmid in elem.iterfind("PMID"))
+                self._root.clear()
+        return records
+
+async def iter_articles(byte_stream):
+    """Yield Articles from an async iterator of XML byte chunks"""
+    parser = ArticleStreamParser()
+    # Parsing is interleaved with network reads, so only the time inside the parser is counted
+    parse_seconds = 0.0
+    try:
+        async for chunk in byte_stream:
+            start = time.perf_counter()
+            records = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - start
+            for record in records:
+                yield record
+        start = time.perf_counter()
+        records = parser.close()
+        parse_seconds += time.perf_counter() - start
+        for record in records:
+            yield record
+    finally:
+        metrics.observe("parse_seconds", parse_seconds, format="xml", endpoint="efetch.fcgi", tool=current_tool.get())
+
+def parse_articles(xml) -> list:
+    """Parse a complete PubmedArticleSet document (str or bytes)"""
+    parser = ArticleStreamParser()
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    return parser.feed(xml) + parser.close()
@@ -0,0 +1,119 @@
+"""
+Post-retrieval reranking. Every candidate gets a combined score
+
+    score = sum(weight[signal] * value[signal])
+
+over these signals, each scaled to 0..1:
+
+    relevance   position in the retrieval order (1 = first, 0 = last)
+    similarity  elink neighbor score relative to the best candidate
+    review      1 for reviews, systematic reviews and meta-analyses
+    recency     halves every RECENCY_HALF_LIFE years since publication
+    journal     1 / tier of the journal list (0 for unlisted journals)
+
+Large candidate batches are scored with NumPy when it is installed (pip
+install numpy), everything else in plain Python. NumPy is imported on the
+first large batch, so short sessions never pay for the import.
+"""
+import os
+import re
+from datetime import date
+from functools import lru_cache
+from journals import get_journal_index
+
+SIGNALS = ("relevance", "similarity", "review", "recency", "journal")
+RECENCY_HALF_LIFE = float(os.environ.get("PUBMED_RECENCY_HALF_LIFE", "5"))
+# Below this many candidates plain Python is as fast as NumPy
+NUMPY_MIN_CANDIDATES = 100
+
+# numpy module once imported, False if it is not installed
+_numpy = None
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+_YEAR = re.compile(r"\d{4}")
+
+def parse_weights(weights, defaults: dict) -> dict:
+    """Per-call weights over the defaults; raises ValueError for unknown signals or non-numeric values"""
+    merged = dict(defaults)
+    for signal, weight in (weights or {}).items():
+        if signal not in SIGNALS:
+            raise ValueError(f"Unknown rank weight '{signal}'; use {', '.join(SIGNALS)}")
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"Rank weight '{signal}' must be a number")
+        merged[signal] = float(weight)
+    return merged
+
+# Dates and journals repeat across candidates, so their signals are computed once per value
+@lru_cache(maxsize=4096)
+def _year(pubdate: str) -> int:
+    match = _YEAR.search(pubdate or "")
+    return int(match.group()) if match else 0
+
+@lru_cache(maxsize=4096)
+def _tier(source: str, nlm_id: str) -> int:
+    return get_journal_index().tier(source, nlm_id) or 0
+
+def combined_scores(summaries: list, weights: dict, similarity: list = None) -> list:
+    """Combined score of each summary (given in retrieval order); `similarity` holds raw neighbor scores"""
+    n = len(summaries)
+    if not n:
+        return []
+    weights = {signal: weight for signal, weight in weights.items() if weight}
+    this_year = date.today().year
+    top_similarity = (max(similarity) or 1) if similarity else 1
+    np = _load_numpy() if n >= NUMPY_MIN_CANDIDATES else None
+    if np is not None:
+        scores = np.zeros(n)
+        if "relevance" in weights:
+            scores += weights["relevance"] * (1.0 - np.arange(n) / max(n - 1, 1))
+        if "similarity" in weights and similarity:
+            scores += weights["similarity"] * (np.asarray(similarity, dtype=float) / top_similarity)
+        if "review" in weights:
+            scores += weights["review"] * np.fromiter((summary.is_review for summary in summaries), dtype=float, count=n)
+        if "recency" in weights:
+            years = np.fromiter((_year(summary.pubdate) for summary in summaries), dtype=float, count=n)
+            age = np.maximum(this_year - years, 0)
+            scores += weights["recency"] * np.where(years > 0, 0.5 ** (age / RECENCY_HALF_LIFE), 0.0)
+        if "journal" in weights:
+            tiers = np.fromiter((_tier(summary.source, summary.nlm_id) for summary in summaries), dtype=float, count=n)
+            scores += weights["journal"] * np.divide(1.0, tiers, out=np.zeros(n), where=tiers > 0)
+        return scores.tolist()
+
+    scores = [0.0] * n
+    for i, summary in enumerate(summaries):
+        score = 0.0
+        if "relevance" in weights:
+            score += weights["relevance"] * (1.0 - i / max(n - 1, 1))
+        if "similarity" in weights and similarity:
+            score += weights["similarity"] * similarity[i] / top_similarity
+        if "review" in weights and summary.is_review:
+            score += weights["review"]
+        if "recency" in weights:
+            year = _year(summary.pubdate)
+            if year:
+                score += weights["recency"] * 0.5 ** (max(this_year - year, 0) / RECENCY_HALF_LIFE)
+        if "journal" in weights:
+            tier = _tier(summary.source, summary.nlm_id)
+            if tier > 0:
+                score += weights["journal"] / tier
+        scores[i] = score
+    return scores
+
+def rerank(summaries: list, weights: dict, similarity: list = None) -> tuple:
+    """(order, scores): indices of the summaries best first (ties keep retrieval order) and their combined scores"""
+    scores = combined_scores(summaries, weights, similarity)
+    np = _load_numpy() if len(scores) >= NUMPY_MIN_CANDIDATES else None
+    if np is not None:
+        order = np.argsort(-np.asarray(scores), kind="stable").tolist()
+    else:
+        order = sorted(range(len(scores)), key=lambda i: -scores[i])
+    return order, scores
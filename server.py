@@ -1,129 +1,156 @@
+"""
+MCP server built on the `mcp` SDK (FastMCP).
+A thin adapter: every tool delegates to engine.py, so results are identical
+to the stdio and HTTP servers.
+"""
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
-import httpx
-import xmltodict
-import json
+import engine
+from engine import TOOLS, startup, shutdown
+
+DESCRIPTIONS = {tool["name"]: tool["description"] for tool in TOOLS}
+
+@asynccontextmanager
+async def lifespan(server):
+    # Share one pooled HTTP client across all tool calls
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
 # Initialize the MCP server
-mcp = FastMCP("PubMed Server")
+mcp = FastMCP("PubMed Server", lifespan=lifespan)
+
+@mcp.tool(description=DESCRIPTIONS["search_pubmed"])
+async def search_pubmed(
+    query: str,
+    max_results: int = 5,
+    rank_weights: dict[str, float] = None,
+    rerank_pool: int = None,
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("search_pubmed", {
+        "query": query, "max_results": max_results, "rank_weights": rank_weights, "rerank_pool": rerank_pool,
+        "format": format, "fields": fields, "budget_ms": budget_ms
+    })
+
+@mcp.tool(description=DESCRIPTIONS["search_pubmed_paged"])
+async def search_pubmed_paged(
+    query: str = None,
+    cursor: str = None,
+    page_size: int = 20,
+    sort: str = "relevance",
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("search_pubmed_paged", {
+        "query": query, "cursor": cursor, "page_size": page_size, "sort": sort, "format": format, "fields": fields, "budget_ms": budget_ms
+    })
+
+@mcp.tool(description=DESCRIPTIONS["multi_search_pubmed"])
+async def multi_search_pubmed(queries: list, max_results: int = 10, format: str = "json", fields: list[str] = None, budget_ms: int = None) -> str:
+    return await engine.call_tool("multi_search_pubmed", {"queries": queries, "max_results": max_results, "format": format, "fields": fields, "budget_ms": budget_ms})
+
+@mcp.tool(description=DESCRIPTIONS["get_paper_details"])
+async def get_paper_details(pmid: str, format: str = "json", fields: list[str] = None, budget_ms: int = None) -> str:
+    return await engine.call_tool("get_paper_details", {"pmid": pmid, "format": format, "fields": fields, "budget_ms": budget_ms})
+
+@mcp.tool(description=DESCRIPTIONS["get_papers_details"])
+async def get_papers_details(pmids: list[str], format: str = "json", fields: list[str] = None, budget_ms: int = None) -> str:
+    return await engine.call_tool("get_papers_details", {"pmids": pmids, "format": format, "fields": fields, "budget_ms": budget_ms})
+
+@mcp.tool(description=DESCRIPTIONS["advanced_search_pubmed"])
+async def advanced_search_pubmed(
+    query: str,
+    author: str = None,
+    journal: str = None,
+    pub_date_from: str = None,
+    pub_date_to: str = None,
+    max_results: int = 5,
+    rank_weights: dict[str, float] = None,
+    rerank_pool: int = None,
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("advanced_search_pubmed", {
+        "query": query, "author": author, "journal": journal, "pub_date_from": pub_date_from,
+        "pub_date_to": pub_date_to, "max_results": max_results, "rank_weights": rank_weights, "rerank_pool": rerank_pool,
+        "format": format, "fields": fields, "budget_ms": budget_ms
+    })
 
-BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+@mcp.tool(description=DESCRIPTIONS["search_local"])
+async def search_local(
+    query: str,
+    author: str = None,
+    journal: str = None,
+    pub_date_from: str = None,
+    pub_date_to: str = None,
+    max_results: int = 10,
+    format: str = "json",
+    fields: list[str] = None
+) -> str:
+    return await engine.call_tool("search_local", {
+        "query": query, "author": author, "journal": journal, "pub_date_from": pub_date_from,
+        "pub_date_to": pub_date_to, "max_results": max_results, "format": format, "fields": fields
+    })
 
-@mcp.tool()
-async def search_pubmed(query: str, max_results: int = 5) -> str:
-    """
-    Search PubMed for papers matching the query.
-    Returns a list of PMIDs and Titles.
-    """
-    async with httpx.AsyncClient() as client:
-        # 1. Search for PMIDs
-        search_params = {
-            "db": "pubmed",
-            "term": query,
-            "retmode": "json",
-            "retmax": max_results,
-            "sort": "relevance"
-        }
-        search_response = await client.get(f"{BASE_URL}/esearch.fcgi", params=search_params)
-        search_data = search_response.json()
-        
-        id_list = search_data.get("esearchresult", {}).get("idlist", [])
-        
-        if not id_list:
-            return "No results found."
+@mcp.tool(description=DESCRIPTIONS["get_similar_articles"])
+async def get_similar_articles(
+    pmid: str,
+    max_results: int = 5,
+    high_impact_only: bool = False,
+    depth: int = 1,
+    rank_weights: dict[str, float] = None,
+    rerank_pool: int = None,
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("get_similar_articles", {
+        "pmid": pmid, "max_results": max_results, "high_impact_only": high_impact_only, "depth": depth,
+        "rank_weights": rank_weights, "rerank_pool": rerank_pool, "format": format, "fields": fields, "budget_ms": budget_ms
+    })
 
-        # 2. Fetch summaries to get titles
-        summary_params = {
-            "db": "pubmed",
-            "id": ",".join(id_list),
-            "retmode": "json"
-        }
-        summary_response = await client.get(f"{BASE_URL}/esummary.fcgi", params=summary_params)
-        summary_data = summary_response.json()
-        
-        results = []
-        uid_data = summary_data.get("result", {})
-        for pmid in id_list:
-            if pmid in uid_data:
-                item = uid_data[pmid]
-                results.append({
-                    "pmid": pmid,
-                    "title": item.get("title", "No title"),
-                    "pubdate": item.get("pubdate", "Unknown date"),
-                    "source": item.get("source", "Unknown source")
-                })
-        
-        return json.dumps(results, indent=2, ensure_ascii=False)
+@mcp.tool(description=DESCRIPTIONS["get_similar_articles_batch"])
+async def get_similar_articles_batch(
+    pmids: list[str],
+    max_results: int = 5,
+    high_impact_only: bool = False,
+    rank_weights: dict[str, float] = None,
+    rerank_pool: int = None,
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("get_similar_articles_batch", {
+        "pmids": pmids, "max_results": max_results, "high_impact_only": high_impact_only,
+        "rank_weights": rank_weights, "rerank_pool": rerank_pool, "format": format, "fields": fields, "budget_ms": budget_ms
+    })
 
-@mcp.tool()
-async def get_paper_details(pmid: str) -> str:
-    """
-    Get detailed information (Abstract, Authors, DOI) for a specific PMID.
-    """
-    async with httpx.AsyncClient() as client:
-        fetch_params = {
-            "db": "pubmed",
-            "id": pmid,
-            "retmode": "xml"
-        }
-        response = await client.get(f"{BASE_URL}/efetch.fcgi", params=fetch_params)
-        
-        # Parse XML
-        data = xmltodict.parse(response.text)
-        
-        try:
-            article = data['PubmedArticleSet']['PubmedArticle']['MedlineCitation']['Article']
-            
-            # Extract Title
-            title = article.get('ArticleTitle', 'No title')
-            
-            # Extract Abstract
-            abstract_text = ""
-            if 'Abstract' in article and 'AbstractText' in article['Abstract']:
-                abs_content = article['Abstract']['AbstractText']
-                if isinstance(abs_content, list):
-                    abstract_text = "\n".join([item.get('#text', '') if isinstance(item, dict) else item for item in abs_content])
-                elif isinstance(abs_content, dict):
-                    abstract_text = abs_content.get('#text', '')
-                else:
-                    abstract_text = abs_content
-            
-            # Extract Authors
-            authors = []
-            if 'AuthorList' in article and 'Author' in article['AuthorList']:
-                auth_list = article['AuthorList']['Author']
-                if isinstance(auth_list, list):
-                    for auth in auth_list:
-                        if 'LastName' in auth and 'ForeName' in auth:
-                            authors.append(f"{auth['LastName']} {auth['ForeName']}")
-                elif isinstance(auth_list, dict):
-                    if 'LastName' in auth_list and 'ForeName' in auth_list:
-                        authors.append(f"{auth_list['LastName']} {auth_list['ForeName']}")
-            
-            # Extract DOI
-            doi = ""
-            if 'ELocationID' in article:
-                eloc = article['ELocationID']
-                if isinstance(eloc, list):
-                    for item in eloc:
-                        if item.get('@EIdType') == 'doi':
-                            doi = item.get('#text')
-                elif isinstance(eloc, dict):
-                    if eloc.get('@EIdType') == 'doi':
-                        doi = eloc.get('#text')
+@mcp.tool(description=DESCRIPTIONS["citation_graph"])
+async def citation_graph(
+    pmids: list[str],
+    depth: int = 1,
+    direction: str = "both",
+    max_links: int = 20,
+    max_nodes: int = 500,
+    format: str = "json",
+    fields: list[str] = None,
+    budget_ms: int = None
+) -> str:
+    return await engine.call_tool("citation_graph", {
+        "pmids": pmids, "depth": depth, "direction": direction, "max_links": max_links,
+        "max_nodes": max_nodes, "format": format, "fields": fields, "budget_ms": budget_ms
+    })
 
-            result = {
-                "pmid": pmid,
-                "title": title,
-                "authors": authors,
-                "journal": article.get('Journal', {}).get('Title', ''),
-                "doi": doi,
-                "abstract": abstract_text
-            }
-            
-            return json.dumps(result, indent=2, ensure_ascii=False)
-            
-        except Exception as e:
-            return f"Error parsing details for PMID {pmid}: {str(e)}"
+@mcp.tool(description=DESCRIPTIONS["get_metrics"])
+async def get_metrics(format: str = "json") -> str:
+    return await engine.call_tool("get_metrics", {"format": format})
 
 if __name__ == "__main__":
     mcp.run()
@@ -0,0 +1,260 @@
+"""
+MCP server over Streamable HTTP (POST /mcp, JSON or Server-Sent Events responses).
+
+One long-lived process serves any number of clients, so they all share the
+warm connection pool, rate limiter, caches and local index instead of each
+spawning a cold stdio process. The tools and protocol handling live in
+engine.py; this module only speaks HTTP.
+
+    python server_http.py --port 8000
+    # client configuration: {"type": "http", "url": "http://127.0.0.1:8000/mcp"}
+
+GET /metrics returns the server metrics in Prometheus text format.
+"""
+import sys
+import json
+import uuid
+import asyncio
+import logging
+import argparse
+import os
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from engine import handle_message, encode_message, get_metrics, startup, shutdown, end_session, MAX_CONCURRENT_REQUESTS
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("pubmed-mcp")
+
+SERVER_HOST = os.environ.get("PUBMED_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("PUBMED_SERVER_PORT", "8000"))
+# Browser origins allowed to call the server (comma-separated); localhost is always allowed
+ALLOWED_ORIGINS = {origin.strip() for origin in os.environ.get("PUBMED_SERVER_ALLOWED_ORIGINS", "").split(",") if origin.strip()}
+MCP_PATH = "/mcp"
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_SESSIONS = 1024
+STATUS_TEXT = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large"
+}
+
+class Session:
+    """Per-client state: requests in flight, so notifications/cancelled can reach them"""
+    __slots__ = ("id", "in_flight")
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.in_flight = {}
+
+def _close_session(session: Session):
+    """Cancel the session's in-flight requests and drop its per-session state"""
+    for task in session.in_flight.values():
+        task.cancel()
+    end_session(session.id)
+
+def _origin_allowed(origin: str) -> bool:
+    """Reject cross-site browser requests (DNS rebinding) unless the origin is local or configured"""
+    if not origin or origin in ALLOWED_ORIGINS:
+        return True
+    return urlsplit(origin).hostname in ("localhost", "127.0.0.1", "::1")
+
+class HttpTransport:
+    def __init__(self):
+        self.sessions = OrderedDict()  # session id -> Session
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, b"Malformed request line")
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    await self._respond(writer, 411, b"Send a Content-Length")
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, b"Invalid Content-Length")
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, b"Request body too large")
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self._route(method, urlsplit(target).path, headers, body, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"HTTP connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, headers: dict, body: bytes, writer):
+        if not _origin_allowed(headers.get("origin")):
+            await self._respond(writer, 403, b"Origin not allowed")
+        elif path == "/metrics" and method == "GET":
+            text = await get_metrics("prometheus")
+            await self._respond(writer, 200, text.encode("utf-8"), "text/plain; version=0.0.4")
+        elif path != MCP_PATH:
+            await self._respond(writer, 404, b"Not found")
+        elif method == "POST":
+            await self._post(headers, body, writer)
+        elif method == "DELETE":
+            session = self.sessions.pop(headers.get("mcp-session-id", ""), None)
+            if session is None:
+                await self._respond(writer, 404, b"Unknown session")
+                return
+            _close_session(session)
+            await self._respond(writer, 200, b"")
+        else:
+            # No server-initiated stream (GET): every message belongs to a POSTed request
+            await self._respond(writer, 405, b"Method not allowed", extra_headers={"Allow": "POST, DELETE"})
+
+    async def _post(self, headers: dict, body: bytes, writer):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            error = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+            await self._respond(writer, 400, json.dumps(error).encode("utf-8"), "application/json")
+            return
+        messages = payload if isinstance(payload, list) else [payload]
+        messages = [message for message in messages if isinstance(message, dict)]
+
+        extra_headers = {}
+        if any(message.get("method") == "initialize" for message in messages):
+            session = Session(uuid.uuid4().hex)
+            self.sessions[session.id] = session
+            while len(self.sessions) > MAX_SESSIONS:
+                _close_session(self.sessions.popitem(last=False)[1])
+            extra_headers["Mcp-Session-Id"] = session.id
+        else:
+            session = self.sessions.get(headers.get("mcp-session-id", ""))
+            if session is None:
+                await self._respond(writer, 404 if "mcp-session-id" in headers else 400, b"Unknown or missing Mcp-Session-Id")
+                return
+            self.sessions.move_to_end(session.id)
+
+        requests = [message for message in messages if "method" in message and message.get("id") is not None]
+        for message in messages:
+            if message.get("method") == "notifications/cancelled":
+                task = session.in_flight.get(message.get("params", {}).get("requestId"))
+                if task is not None:
+                    logger.info(f"Cancelling request {message['params']['requestId']} of session {session.id}")
+                    task.cancel()
+            elif "method" in message and message.get("id") is None:
+                await handle_message(message, _discard)
+        if not requests:
+            await self._respond(writer, 202, b"", extra_headers=extra_headers)
+            return
+
+        outgoing = asyncio.Queue()
+
+        async def run(message):
+            try:
+                async with self.semaphore:
+                    await handle_message(message, outgoing.put, flow=(session.id, message["id"]), session=session.id)
+            finally:
+                session.in_flight.pop(message["id"], None)
+                await outgoing.put(None)  # marks one request as finished
+
+        tasks = []
+        for message in requests:
+            task = asyncio.create_task(run(message))
+            session.in_flight[message["id"]] = task
+            tasks.append(task)
+
+        # Stream over SSE when the client wants progress notifications, otherwise answer with plain JSON
+        wants_progress = any(message.get("params", {}).get("_meta", {}).get("progressToken") is not None for message in requests)
+        if wants_progress and "text/event-stream" in headers.get("accept", ""):
+            await self._stream(writer, outgoing, len(tasks), tasks, extra_headers)
+            return
+        responses = []
+        finished = 0
+        while finished < len(tasks):
+            message = await outgoing.get()
+            if message is None:
+                finished += 1
+            elif isinstance(message, str) or "id" in message:
+                # Responses only; progress notifications need the SSE stream
+                responses.append(message)
+        if isinstance(payload, list):
+            body = "[" + ", ".join(map(encode_message, responses)) + "]"
+        elif responses:
+            body = encode_message(responses[0])
+        else:
+            await self._respond(writer, 202, b"", extra_headers=extra_headers)
+            return
+        await self._respond(writer, 200, body.encode("utf-8"), "application/json", extra_headers)
+
+    async def _stream(self, writer, outgoing: asyncio.Queue, pending: int, tasks: list, extra_headers: dict):
+        """Send notifications and responses as SSE events, chunk-encoded so the connection can be reused"""
+        head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache", "Transfer-Encoding: chunked"]
+        head.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        try:
+            while pending:
+                message = await outgoing.get()
+                if message is None:
+                    pending -= 1
+                    continue
+                event = f"event: message\ndata: {encode_message(message)}\n\n".encode("utf-8")
+                writer.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            # Client went away mid-stream: stop the work it was waiting for
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def _respond(self, writer, status: int, body: bytes, content_type: str = "text/plain", extra_headers: dict = None):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Length: {len(body)}"]
+        if body:
+            head.append(f"Content-Type: {content_type}")
+        head.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+async def _discard(message):
+    pass
+
+async def run_server(host: str = SERVER_HOST, port: int = SERVER_PORT):
+    await startup()
+    transport = HttpTransport()
+    server = await asyncio.start_server(transport.handle_connection, host, port, limit=64 * 1024)
+    logger.info(f"Listening on http://{host}:{port}{MCP_PATH}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVER_HOST, help="Interface to bind (default: PUBMED_SERVER_HOST or 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port (default: PUBMED_SERVER_PORT or 8000)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_server(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()